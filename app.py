@@ -2,19 +2,23 @@ import streamlit as st
 from card_generation import CartaoPrograma
 from model_training import PrevisorCrime
 from data_processing import CrimeData
+from model_cache import CacheModelos
+from patrol_points import PontosPatrulhamento
+from shift_schedule import Escala
 from graphs import (
     create_hourly_crime_graph,
     create_neighborhood_crime_graph,
     create_weekday_crime_graph,
     create_crime_type_pareto_graph,
     create_crime_trend_graph,
-    create_shift_crime_graph
+    create_shift_crime_graph,
+    cache_figuras
 )
-import folium
+from maps import CAMADAS_HISTORICAS, criar_mapa_base, criar_camada_pontos
 from streamlit_folium import st_folium
 import pandas as pd
-from utils import dias_da_semana
-from datetime import datetime, time
+import io
+import json
 
 # Configuração da página
 st.set_page_config(page_title="Cartão Programa Automatizado", layout='wide')
@@ -32,50 +36,183 @@ try:
 except FileNotFoundError:
     st.warning("Arquivo style.css não encontrado. Certifique-se de que o arquivo de estilo está no diretório correto.")
 
+# Quantidade de linhas do CSV convertidas por vez; limita apenas o pico da conversão do texto, pois os blocos
+# convertidos (e o arquivo enviado, em bytes) continuam inteiros em memória
+TAMANHO_BLOCO_CSV = 200_000
+
+# Parâmetros do previsor; o motor com ajuste parcial faz as atualizações diárias custarem apenas o tamanho do delta
+PARAMETROS_PREVISOR = {"usar_tensor": True, "motor": "sgd"}
+
+# Durações de horário (minutos) oferecidas na escala do cartão
+DURACOES_SLOT = [60, 30, 20, 15]
+MAXIMO_PARADAS_POR_SLOT = 6
+MAXIMO_DIAS_CARTAO = 31
+
+@st.cache_resource
+def obter_cache_modelos():
+    """Cache de modelos compartilhado entre todas as sessões do servidor."""
+    return CacheModelos()
+
+
+def carregar_dados_e_modelo(conteudo):
+    """Processa os dados e treina o modelo, reaproveitando o cache quando o arquivo já foi processado."""
+    def treinar():
+        crime_data = CrimeData(io.BytesIO(conteudo), tamanho_bloco=TAMANHO_BLOCO_CSV)
+        previsor = PrevisorCrime(crime_data, **PARAMETROS_PREVISOR)
+        previsor.treinar_modelo()
+        return crime_data, previsor
+
+    # Entradas treinadas com outros parâmetros ou em outro formato de classes não são reaproveitadas
+    chave = CacheModelos.calcular_chave_modelo(conteudo, tamanho_bloco=TAMANHO_BLOCO_CSV, **PARAMETROS_PREVISOR)
+    crime_data, previsor = obter_cache_modelos().obter_ou_criar(chave, treinar)
+    return chave, crime_data, previsor
+
+def gerar_cartao(escala, roteirizar, viaturas, chave_viaturas):
+    """Gera os pontos e o Excel do cartão programa com a escala informada e os guarda na sessão.
+
+    A sessão só é alterada depois que a geração termina, mantendo o cartão anterior inteiro em caso de erro.
+    """
+    cartao_programa = CartaoPrograma(
+        st.session_state.previsor, st.session_state.crime_data, escala=escala, roteirizar=roteirizar, viaturas=viaturas
+    )
+    pontos_patrulhamento = cartao_programa.gerar_pontos_patrulhamento()
+    # Excel gerado em memória e guardado na sessão, sem arquivos em disco
+    excel_bytes = cartao_programa.gerar_excel_bytes()
+
+    st.session_state.cartao_programa = cartao_programa
+    st.session_state.pontos_patrulhamento = pontos_patrulhamento
+    st.session_state.excel_bytes = excel_bytes
+    st.session_state.chave_viaturas = chave_viaturas
+
+@st.cache_resource(max_entries=8)
+def obter_mapa_base(chave_dados, _crime_data, camadas):
+    """Mapa base por conjunto de dados e camadas, reaproveitado entre as interações."""
+    return criar_mapa_base(_crime_data, camadas)
+
 st.header('Sistema de Geração de Cartão Programa Automatizado')
 st.sidebar.image('img/icon.png', caption='Cartão Programa Automatizado')
 
 # Inicialização das variáveis de estado da sessão
 if 'pontos_patrulhamento' not in st.session_state:
-    st.session_state.pontos_patrulhamento = []
+    st.session_state.pontos_patrulhamento = PontosPatrulhamento()
 if 'dados_carregados' not in st.session_state:
     st.session_state.dados_carregados = False
 if 'crime_data' not in st.session_state:
     st.session_state.crime_data = None
-if 'excel_path' not in st.session_state:
-    st.session_state.excel_path = None
-
-# Definição das faixas horárias
-faixas_horarias = [
-    ("00:00-05:59", time(0, 0), time(5, 59)),
-    ("06:00-11:59", time(6, 0), time(11, 59)),
-    ("12:00-17:59", time(12, 0), time(17, 59)),
-    ("18:00-23:59", time(18, 0), time(23, 59))
-]
+if 'excel_bytes' not in st.session_state:
+    st.session_state.excel_bytes = None
+if 'chave_viaturas' not in st.session_state:
+    st.session_state.chave_viaturas = None
+if 'chave_dados' not in st.session_state:
+    st.session_state.chave_dados = None
+if 'previsor' not in st.session_state:
+    st.session_state.previsor = None
+if 'cartao_programa' not in st.session_state:
+    st.session_state.cartao_programa = None
+if 'deltas_anexados' not in st.session_state:
+    st.session_state.deltas_anexados = set()
 
 # Upload de dados
 with st.sidebar:
-    uploaded_file = st.file_uploader(label="Fazer Upload dos dados criminais!", help="Clique no botão abaixo 'Browse Files'", type=["csv"])
+    # Escala dos cartões: turnos de um arquivo JSON (opcional), duração dos horários, paradas por horário e dias
+    arquivo_definicao = st.file_uploader(label="Definição da escala (opcional)", help="JSON com os turnos e demais campos da escala", type=["json"], key="definicao_escala")
+    definicao = {}
+    if arquivo_definicao is not None:
+        try:
+            definicao = json.load(arquivo_definicao)
+            if not isinstance(definicao, dict):
+                raise ValueError("o arquivo deve conter um objeto JSON com os campos da escala")
+            # Valida a definição completa antes de usá-la como padrão dos controles
+            Escala.de_dicionario(definicao)
+        except (TypeError, ValueError) as e:
+            st.error(f"Definição de escala inválida, usando a escala padrão: {e}")
+            definicao = {}
+    padrao = Escala.de_dicionario(definicao)
+
+    duracao_slot = st.selectbox(
+        "Duração de cada horário (minutos)", options=DURACOES_SLOT,
+        index=DURACOES_SLOT.index(padrao.duracao_slot) if padrao.duracao_slot in DURACOES_SLOT else 0
+    )
+    paradas_por_slot = st.number_input("Paradas por horário", min_value=1, max_value=MAXIMO_PARADAS_POR_SLOT, value=min(padrao.paradas_por_slot, MAXIMO_PARADAS_POR_SLOT))
+    dias_cartao = st.number_input("Dias do cartão", min_value=1, max_value=MAXIMO_DIAS_CARTAO, value=min(padrao.dias, MAXIMO_DIAS_CARTAO))
+    try:
+        escala = Escala(**{
+            **definicao, "duracao_slot": duracao_slot, "paradas_por_slot": paradas_por_slot, "dias": dias_cartao,
+            "duracao_parada": min(padrao.duracao_parada, duracao_slot // paradas_por_slot)
+        })
+    except (TypeError, ValueError) as e:
+        st.error(f"Escala inválida, usando a escala padrão: {e}")
+        escala = Escala()
+
+    roteirizar = st.checkbox("Otimizar a rota dos pontos em cada turno", value=False)
+    arquivo_escala = st.file_uploader(label="Escala de viaturas (opcional)", help="CSV com as colunas VIATURA e BAIRRO, separadas por ';'", type=["csv"], key="escala")
+    viaturas = chave_viaturas = None
+    if arquivo_escala is not None:
+        try:
+            viaturas = pd.read_csv(arquivo_escala, sep=";", encoding="utf-8")
+            if not {"VIATURA", "BAIRRO"} <= set(viaturas.columns):
+                raise ValueError("o arquivo deve ter as colunas VIATURA e BAIRRO")
+            chave_viaturas = CacheModelos.calcular_chave(arquivo_escala.getvalue())
+        except ValueError as e:
+            st.error(f"Escala de viaturas inválida, gerando um único cartão: {e}")
+            viaturas = None
+    uploaded_file = st.file_uploader(label="Fazer Upload dos dados criminais!", help="Clique no botão abaixo 'Browse Files'", type=["csv", "parquet", "feather"])
     if uploaded_file is not None and not st.session_state.dados_carregados:
         try:
-            st.session_state.crime_data = CrimeData(uploaded_file)
-            previsor = PrevisorCrime(st.session_state.crime_data)
-            previsor.treinar_modelo()
-            cartao_programa = CartaoPrograma(previsor, st.session_state.crime_data)
-            st.session_state.pontos_patrulhamento = cartao_programa.gerar_pontos_patrulhamento()
-            st.session_state.excel_path = cartao_programa.gerar_excel("cartao_programa.xlsx")
+            st.session_state.chave_dados, st.session_state.crime_data, previsor = carregar_dados_e_modelo(uploaded_file.getvalue())
+            st.session_state.previsor = previsor
+            gerar_cartao(escala, roteirizar, viaturas, chave_viaturas)
             st.success("Cartão programa gerado com sucesso!")
             st.session_state.dados_carregados = True
 
         except Exception as e:
             st.error(f"Ocorreu um erro: {e}")
     
+    # Uma nova escala, opção de rota ou escala de viaturas gera o cartão novamente, sem reprocessar os dados nem treinar o modelo
+    cartao_atual = st.session_state.cartao_programa
+    if st.session_state.dados_carregados and (
+        cartao_atual.escala != escala or cartao_atual.roteirizar != roteirizar
+        or st.session_state.chave_viaturas != chave_viaturas
+    ):
+        try:
+            gerar_cartao(escala, roteirizar, viaturas, chave_viaturas)
+        except Exception as e:
+            st.error(f"Ocorreu um erro ao aplicar a escala: {e}")
+
+    # Novas ocorrências anexadas aos dados já carregados, sem reprocessar o histórico
+    if st.session_state.dados_carregados:
+        arquivo_delta = st.file_uploader(label="Anexar novas ocorrências", type=["csv", "parquet", "feather"], key="delta")
+        if arquivo_delta is not None:
+            conteudo_delta = arquivo_delta.getvalue()
+            chave_delta = CacheModelos.calcular_chave(conteudo_delta)
+            if chave_delta not in st.session_state.deltas_anexados:
+                try:
+                    novos = st.session_state.crime_data.anexar(io.BytesIO(conteudo_delta))
+                    # Registrado assim que os dados mudam, para que uma falha adiante não anexe as mesmas linhas de novo
+                    st.session_state.chave_dados = CacheModelos.calcular_chave((st.session_state.chave_dados + chave_delta).encode())
+                    st.session_state.deltas_anexados.add(chave_delta)
+                    st.session_state.previsor.atualizar_modelo(novos)
+                    gerar_cartao(escala, roteirizar, viaturas, chave_viaturas)
+                    st.success(f"{len(novos)} novas ocorrências anexadas!")
+
+                except Exception as e:
+                    st.error(f"Ocorreu um erro ao anexar as ocorrências: {e}")
+
     # Botão de download fora do bloco condicional anterior
-    if st.session_state.dados_carregados and st.session_state.excel_path:
+    if st.session_state.dados_carregados and st.session_state.excel_bytes:
+        # Com escala de viaturas, o cartão de cada viatura pode ser baixado separadamente
+        viaturas_cartao = st.session_state.pontos_patrulhamento.viaturas()
+        viatura_download = None
+        if viaturas_cartao:
+            viatura_download = st.selectbox(
+                "Cartão para download:", options=[None] + viaturas_cartao,
+                format_func=lambda viatura: "Todas as viaturas" if viatura is None else viatura
+            )
         st.download_button(
             label="Baixar Cartões Programa (Excel)",
-            data=open(st.session_state.excel_path, "rb").read(),
-            file_name="cartões_programa.xlsx",
+            data=st.session_state.excel_bytes if viatura_download is None
+            else st.session_state.cartao_programa.gerar_excel_bytes(viatura_download),
+            file_name="cartões_programa.xlsx" if viatura_download is None else f"cartão_{viatura_download}.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
 
@@ -84,56 +221,67 @@ if st.session_state.dados_carregados and len(st.session_state.pontos_patrulhamen
         # Gráficos de análise
         st.write("## Gráficos de Análise:")
         col1, col2, col3 = st.columns(3)
-        col1.plotly_chart(create_hourly_crime_graph(st.session_state.crime_data.df), use_container_width=True)
-        col2.plotly_chart(create_neighborhood_crime_graph(st.session_state.crime_data.df), use_container_width=True)
-        col3.plotly_chart(create_weekday_crime_graph(st.session_state.crime_data.df), use_container_width=True)
+        col1.plotly_chart(cache_figuras.obter(create_hourly_crime_graph, st.session_state.crime_data), use_container_width=True)
+        col2.plotly_chart(cache_figuras.obter(create_neighborhood_crime_graph, st.session_state.crime_data), use_container_width=True)
+        col3.plotly_chart(cache_figuras.obter(create_weekday_crime_graph, st.session_state.crime_data), use_container_width=True)
 
         col4, col5, col6 = st.columns(3)
-        col4.plotly_chart(create_crime_type_pareto_graph(st.session_state.crime_data.df), use_container_width=True)
-        col5.plotly_chart(create_crime_trend_graph(st.session_state.crime_data.df), use_container_width=True)
-        col6.plotly_chart(create_shift_crime_graph(st.session_state.crime_data.df), use_container_width=True)
+        col4.plotly_chart(cache_figuras.obter(create_crime_type_pareto_graph, st.session_state.crime_data), use_container_width=True)
+        col5.plotly_chart(cache_figuras.obter(create_crime_trend_graph, st.session_state.crime_data), use_container_width=True)
+        col6.plotly_chart(cache_figuras.obter(create_shift_crime_graph, st.session_state.crime_data, escala=escala), use_container_width=True)
 
-        # Seletores para dia e horário
+        # Seletores para dia e horário, com os dias e turnos da escala do cartão
         st.write("## Mapa de Pontos de Patrulhamento:")
+        escala_cartao = st.session_state.pontos_patrulhamento.escala
+        faixas_horarias = escala_cartao.rotulos_turnos()
         col1, col2 = st.columns(2)
         with col1:
             dia_selecionado = st.selectbox(
-                "Selecione o dia da semana:",
-                options=[(i, nome) for i, nome in dias_da_semana.items()],
-                format_func=lambda x: x[1]
+                "Selecione o dia:",
+                options=range(escala_cartao.dias),
+                format_func=escala_cartao.titulo_dia
             )
         with col2:
             faixa_horaria = st.selectbox(
                 "Selecione a faixa horária:",
-                options=[f[0] for f in faixas_horarias]
+                options=range(len(faixas_horarias)),
+                format_func=lambda indice: faixas_horarias[indice]
+            )
+
+        # Com escala de viaturas, o mapa mostra os pontos de uma viatura ou de todas
+        viaturas_mapa = st.session_state.pontos_patrulhamento.viaturas()
+        viatura_selecionada = None
+        if viaturas_mapa:
+            viatura_selecionada = st.selectbox(
+                "Selecione a viatura:", options=[None] + viaturas_mapa,
+                format_func=lambda viatura: "Todas as viaturas" if viatura is None else viatura
             )
 
-        # Encontrar os limites de horário selecionados
-        horario_inicio = next(f[1] for f in faixas_horarias if f[0] == faixa_horaria)
-        horario_fim = next(f[2] for f in faixas_horarias if f[0] == faixa_horaria)
-
-        # Filtrar pontos por dia e horário
-        pontos_filtrados = [
-            ponto for ponto in st.session_state.pontos_patrulhamento 
-            if ponto["DIA_SEMANA"] == dia_selecionado[0] and
-            horario_inicio <= ponto["HORARIO_INICIO"].time() <= horario_fim
-        ]
-
-        # Criar mapa
-        if pontos_filtrados:
-            localizacao_inicial = [pontos_filtrados[0]["LATITUDE"], pontos_filtrados[0]["LONGITUDE"]]
-            mapa = folium.Map(location=localizacao_inicial, zoom_start=15, tiles='OpenStreetMap')
-
-            for ponto in pontos_filtrados:
-                folium.Marker(
-                    location=[ponto["LATITUDE"], ponto["LONGITUDE"]],
-                    popup=(f"<b>Dia:</b> {dias_da_semana[ponto['DIA_SEMANA']]}<br>"
-                           f"<b>Horário:</b> {ponto['HORARIO_INICIO'].strftime('%H:%M')} - {ponto['HORARIO_TERMINO'].strftime('%H:%M')}<br>"
-                           f"<b>Bairro:</b> {ponto['BAIRRO']}<br><b>Objetivo:</b> {ponto['OBJETIVO']}"),
-                    icon=folium.Icon(color="blue")
-                ).add_to(mapa)
-
-            st_folium(mapa, width='100%', height=700)
+        # Filtrar pontos por dia e horário pelo índice pré-calculado
+        pontos_filtrados = st.session_state.pontos_patrulhamento.filtrar(
+            dia_selecionado, faixa_horaria, viatura_selecionada
+        )
+
+        # Mapa base (com as ocorrências históricas) mantido em cache; apenas a camada de pontos muda com o filtro
+        camadas = st.multiselect(
+            "Camadas de ocorrências históricas:",
+            options=list(CAMADAS_HISTORICAS),
+            default=["calor"],
+            format_func=CAMADAS_HISTORICAS.get
+        )
+        mapa = obter_mapa_base(st.session_state.chave_dados, st.session_state.crime_data, tuple(camadas))
+
+        if not pontos_filtrados.empty:
+            localizacao_inicial = [pontos_filtrados["LATITUDE"].iloc[0], pontos_filtrados["LONGITUDE"].iloc[0]]
+            st_folium(
+                mapa,
+                feature_group_to_add=criar_camada_pontos(pontos_filtrados),
+                center=localizacao_inicial,
+                zoom=15,
+                width='100%',
+                height=700,
+                key=f"mapa_{'_'.join(camadas)}"
+            )
         else:
             st.warning("Não há pontos de patrulhamento para o dia e horário selecionados.")
 
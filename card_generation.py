@@ -1,11 +1,21 @@
+import atexit
+import io
+import os
+import time as cronometro
+import numpy as np
 import pandas as pd
 import openpyxl
 from openpyxl.styles import Font, Alignment, PatternFill
-from concurrent.futures import ProcessPoolExecutor
-from datetime import datetime, time, date, timedelta
-from functools import lru_cache
+from openpyxl.utils import get_column_letter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import logging
-from utils import interpretar_previsoes, dias_da_semana
+from data_processing import sortear_enderecos
+from hotspots import pontuar_horarios, selecionar_hotspots
+from patrol_points import PontosPatrulhamento
+from routing import otimizar_rotas
+from shared_data import DadosCompartilhados
+from shift_schedule import Escala
+from utils import interpretar_previsoes
 
 # Configurar logging
 logging.basicConfig(
@@ -14,13 +24,123 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Backends de execução aceitos e granularidades das tarefas (um dia, um turno ou um horário da escala por tarefa)
+BACKENDS = ("auto", "serial", "threads", "processos")
+GRANULARIDADES = ("dia", "turno", "horario")
+
+# Limiares do modo automático. Abaixo de LIMIAR_PARADAS_PARALELO a execução serial foi medida como a mais rápida
+# (cartão de 22.320 paradas, um núcleo: 0,07 s em série contra 0,16 s com processos); acima de LIMIAR_LINHAS_PROCESSOS
+# publicar as tabelas de consulta para os processos custa mais que o ganho
+LIMIAR_PARADAS_PARALELO = 25_000
+LIMIAR_LINHAS_PROCESSOS = 5_000_000
+
+# Pools reaproveitados entre as gerações de cartões
+_executores = {}
+
+# (duração em s, paradas) das tarefas de cada backend, medidas em todas as gerações do processo
+_tempos_backends = {}
+
+
+def _obter_executor(backend):
+    if backend not in _executores:
+        _executores[backend] = ProcessPoolExecutor() if backend == "processos" else ThreadPoolExecutor()
+        atexit.register(_executores[backend].shutdown)
+    return _executores[backend]
+
+
+def _processar_slots_compartilhados(descritor, selecao, semente):
+    """Gera os pontos de um bloco de horários a partir dos dados compartilhados, sem receber o DataFrame nem o modelo."""
+    return _processar_slots(DadosCompartilhados.anexar(descritor), selecao, semente)
+
+
+def _processar_slots(dados, selecao, semente):
+    """Gera as colunas dos pontos de um bloco de paradas (horários em minutos desde a meia-noite)."""
+    rng = np.random.default_rng(semente)
+
+    # O ponto fica no centro da célula mais densa do bairro no horário; o endereço é sorteado entre os da célula,
+    # pelo número de ocorrências em cada um
+    celulas = np.asarray(selecao["CELULA"])
+    enderecos = sortear_enderecos(
+        dados["ACUMULADO_ENDERECOS"], dados["BASE_POR_CELULA"], dados["TOTAL_POR_CELULA"], celulas, rng
+    )
+
+    dias = np.asarray(selecao["DIA_SEMANA"])
+    horas = np.asarray(selecao["HORA"])
+    bairros = list(selecao["BAIRRO"])
+
+    # Previsões do modelo já calculadas em lote (e memoizadas pelo previsor) para cada horário
+    objetivos = []
+    for i in range(len(celulas)):
+        try:
+            objetivos.append(interpretar_previsoes(
+                selecao["TIPO_CRIME"][i], selecao["PROBABILIDADE"][i], int(dias[i]), int(horas[i])
+            ))
+        except Exception as e:
+            logger.warning(f"Erro ao interpretar a previsão do dia {dias[i]} às {horas[i]}h: {e}")
+            objetivos.append("")
+
+    # Início e término de cada parada já vêm da grade da escala
+    return {
+        "DIA": np.asarray(selecao["DIA"], dtype=np.int16),
+        "DIA_SEMANA": dias.astype(np.int8),
+        "HORARIO_INICIO": np.asarray(selecao["INICIO"], dtype=np.int16),
+        "HORARIO_TERMINO": np.asarray(selecao["TERMINO"], dtype=np.int16),
+        "BAIRRO": bairros,
+        "LOGRADOURO": dados["LOGRADOUROS"][dados["LOGRADOURO_ENDERECO"][enderecos]].tolist(),
+        "LATITUDE": np.round(np.asarray(dados["LATITUDE_CELULA"][celulas], dtype=np.float64), 6),
+        "LONGITUDE": np.round(np.asarray(dados["LONGITUDE_CELULA"][celulas], dtype=np.float64), 6),
+        "OBJETIVO": objetivos,
+        "MISSAO": [f"Patrulhamento preventivo em {bairro}" for bairro in bairros],
+        "OBSERVACAO": [""] * len(celulas),
+        **({"VIATURA": list(selecao["VIATURA"])} if "VIATURA" in selecao else {})
+    }
+
+
+def normalizar_viaturas(viaturas, bairros):
+    """Converte a escala de viaturas (dicionário viatura -> bairros ou DataFrame com VIATURA e BAIRRO)
+    em uma lista de (viatura, códigos dos bairros)."""
+    if hasattr(viaturas, "groupby"):
+        viaturas = {viatura: grupo["BAIRRO"].tolist() for viatura, grupo in viaturas.groupby("VIATURA", sort=False)}
+
+    indice_bairros = pd.Index(bairros)
+    escala = []
+    for viatura, bairros_viatura in viaturas.items():
+        unicos = pd.unique(pd.Series(list(bairros_viatura), dtype=object))
+        codigos = indice_bairros.get_indexer(unicos)
+        if (codigos < 0).any() or len(codigos) == 0:
+            desconhecidos = [b for b, c in zip(unicos, codigos) if c < 0]
+            raise ValueError(f"Viatura {viatura} sem bairros válidos ou com bairros desconhecidos: {desconhecidos}")
+        escala.append((str(viatura), codigos))
+    return escala
+
+
 class CartaoPrograma:
-    def __init__(self, previsores, crime_data):
+    def __init__(self, previsores, crime_data, backend="auto", granularidade="dia", semente=None, escala=None,
+                 roteirizar=False, tolerancia_rota=0, viaturas=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend inválido: {backend}. Opções: {BACKENDS}")
+        if granularidade not in GRANULARIDADES:
+            raise ValueError(f"Granularidade inválida: {granularidade}. Opções: {GRANULARIDADES}")
+
         self.previsores = previsores
         self.crime_data = crime_data
-        self.pontos_patrulhamento = []
+        self.backend = backend
+        self.granularidade = granularidade
+        self.semente = semente  # Com semente fixa, os cartões gerados novamente são idênticos
+        self.escala = escala if escala is not None else Escala()  # Turnos, horários, paradas por horário e dias
+        self.roteirizar = roteirizar  # Reordenar as paradas de cada turno pela menor distância
+        # Deslocamento máximo (horas) de cada parada em relação à hora prevista; 0 reordena apenas dentro da hora
+        self.tolerancia_rota = tolerancia_rota
+        self.distancias_rota = None  # Distância total (km) antes e depois da otimização das rotas
+        self.pontos_patrulhamento = PontosPatrulhamento(escala=self.escala)
+        self.tempos_execucao = {}  # (duração em s, paradas) de cada geração, por backend
+        self._excel_bytes = {}  # Excel em memória dos pontos atuais, por viatura (None = todas)
+        self._dados_compartilhados = None
         self._validar_dados()
 
+        # Escala de viaturas com seus bairros; sem escala é gerado um único cartão com todos os bairros
+        self.viaturas = None if viaturas is None else normalizar_viaturas(viaturas, crime_data.label_encoder.classes_)
+
     def _validar_dados(self):
         required_columns = ["DIA_SEMANA", "HORARIO_FATO", "BAIRRO", "LOGRADOURO", "LATITUDE", "LONGITUDE"]
 
@@ -31,96 +151,192 @@ class CartaoPrograma:
         if self.crime_data.df.empty:
             raise ValueError("DataFrame está vazio")
 
+    def _tabelas_consulta(self):
+        """Colunas numéricas e tabelas de consulta usadas na montagem dos pontos."""
+        return {
+            "LOGRADOUROS": self.crime_data.logradouros,
+            "LOGRADOURO_ENDERECO": self.crime_data.logradouro_endereco,
+            "ACUMULADO_ENDERECOS": self.crime_data.acumulado_enderecos,
+            "BASE_POR_CELULA": self.crime_data.base_por_celula,
+            "TOTAL_POR_CELULA": self.crime_data.total_por_celula,
+            "LATITUDE_CELULA": self.crime_data.latitude_celula,
+            "LONGITUDE_CELULA": self.crime_data.longitude_celula
+        }
+
+    def _publicar_dados(self):
+        """Publica uma única vez as tabelas de consulta para os processos de trabalho."""
+        if self._dados_compartilhados is None:
+            self._dados_compartilhados = DadosCompartilhados(self._tabelas_consulta())
+        return self._dados_compartilhados.descritor
+
+    def liberar(self):
+        """Remove os dados compartilhados com os processos de trabalho."""
+        if self._dados_compartilhados is not None:
+            self._dados_compartilhados.liberar()
+            self._dados_compartilhados = None
+
+    def _escolher_backend(self, total_paradas):
+        """Escolhe o backend pelo volume de trabalho, número de núcleos, tamanho dos dados e tempos já medidos.
+
+        A seleção e as previsões já são vetorizadas no processo principal e as tarefas apenas montam as colunas:
+        cartões pequenos ou máquinas de um núcleo usam a execução serial. Nos demais casos cada backend viável
+        é experimentado uma vez e, depois, é usado o de menor custo medido (segundos por parada) no processo.
+        """
+        if self.backend != "auto":
+            return self.backend
+
+        nucleos = os.cpu_count() or 1
+        if nucleos == 1 or total_paradas < LIMIAR_PARADAS_PARALELO:
+            return "serial"
+
+        candidatos = ["serial", "threads"]
+        if len(self.crime_data.df) <= LIMIAR_LINHAS_PROCESSOS:
+            candidatos.append("processos")
+        for backend in candidatos:
+            if backend not in _tempos_backends:
+                return backend
+
+        custos = {
+            backend: sum(duracao for duracao, _ in _tempos_backends[backend])
+            / max(sum(paradas for _, paradas in _tempos_backends[backend]), 1)
+            for backend in candidatos
+        }
+        return min(custos, key=custos.get)
+
     def gerar_pontos_patrulhamento(self):
         logger.info("Iniciando geração de pontos de patrulhamento")
-        self.pontos_patrulhamento = []
+        self.pontos_patrulhamento = PontosPatrulhamento(escala=self.escala)
+        self._excel_bytes = {}
 
         try:
-            with ProcessPoolExecutor() as executor:
-                futures = [executor.submit(self._processar_dia, dia) for dia in range(7)]
-                for future in futures:
-                    self.pontos_patrulhamento.extend(future.result())
+            # Probabilidades do modelo para todos os bairros nos 7 x 24 horários, em uma única chamada
+            classes = self.crime_data.label_encoder.classes_
+            grade = np.meshgrid(np.arange(len(classes)), np.arange(7), np.arange(24), indexing="ij")
+            tipos_grade, probabilidades_grade = self.previsores.prever_lote(
+                classes[grade[0].ravel()], grade[1].ravel(), grade[2].ravel()
+            )
+            tipos_grade = np.asarray(tipos_grade).reshape(grade[0].shape)
+            probabilidades_grade = np.asarray(probabilidades_grade).reshape(grade[0].shape)
+
+            # Pontuação (contagens x probabilidades) levada à grade da escala: dias do cartão x horários do dia
+            escala = self.escala
+            k = escala.paradas_por_slot
+            pontuacao = pontuar_horarios(self.crime_data.cubo, probabilidades_grade)
+            pontuacao = pontuacao[:, escala.dias_semana()[:, None], (escala.inicio_slots // 60)[None, :]]
+
+            # Os k bairros de maior pontuação de cada horário, variando dentro do turno; previsões e pontuação
+            # são calculadas uma vez e compartilhadas por todas as viaturas
+            frota = self.viaturas or [(None, np.arange(len(classes)))]
+            sementes = np.random.default_rng(self.semente).integers(0, 2 ** 32, size=len(frota))
+            codigos = np.concatenate([
+                bairros_viatura[selecionar_hotspots(
+                    pontuacao[bairros_viatura], escala.turno_slots, escala.posicao_slots, k, int(semente)
+                )].ravel()
+                for (_, bairros_viatura), semente in zip(frota, sementes)
+            ])
 
-            self.pontos_patrulhamento.sort(key=lambda x: (x["DIA_SEMANA"], x["HORARIO_INICIO"]))
-            logger.info(f"Gerados {len(self.pontos_patrulhamento)} pontos de patrulhamento")
+            # Grade vetorizada dia x horário x parada, repetida para cada viatura na mesma ordem dos códigos
+            selecao = {coluna: np.tile(valores, len(frota)) for coluna, valores in escala.grade().items()}
+            dias, horas = selecao["DIA_SEMANA"], selecao["HORA"]
+            selecao.update({
+                "BAIRRO_CODIGO": codigos,
+                "CELULA": self.crime_data.consultar_celulas(codigos, dias, horas),
+                "BAIRRO": classes[codigos],
+                "TIPO_CRIME": tipos_grade[codigos, dias, horas],
+                "PROBABILIDADE": probabilidades_grade[codigos, dias, horas]
+            })
+            if self.viaturas:
+                selecao["VIATURA"] = np.repeat([viatura for viatura, _ in frota], len(codigos) // len(frota))
+
+            backend = self._escolher_backend(len(codigos))
+            inicio = cronometro.perf_counter()
+            blocos = self._executar(backend, selecao, len(codigos))
+            # Apenas as tarefas entram no tempo do backend, sem a montagem do armazenamento nem a roteirização
+            duracao = cronometro.perf_counter() - inicio
+            self.tempos_execucao.setdefault(backend, []).append((duracao, len(codigos)))
+            _tempos_backends.setdefault(backend, []).append((duracao, len(codigos)))
+
+            # O armazenamento colunar já ordena os pontos por dia e horário e indexa pelos turnos da escala
+            self.pontos_patrulhamento = PontosPatrulhamento.de_colunas(blocos, escala)
+            if self.roteirizar:
+                self.pontos_patrulhamento, self.distancias_rota = otimizar_rotas(
+                    self.pontos_patrulhamento, self.tolerancia_rota
+                )
+                logger.info(
+                    f"Rotas otimizadas: {self.distancias_rota[0]:.1f} km -> {self.distancias_rota[1]:.1f} km"
+                )
+                if self.tolerancia_rota > 0:
+                    self._atualizar_objetivos(tipos_grade, probabilidades_grade)
+            logger.info(
+                f"Gerados {len(self.pontos_patrulhamento)} pontos de patrulhamento "
+                f"(backend {backend}, granularidade {self.granularidade}, {duracao:.3f}s)"
+            )
             return self.pontos_patrulhamento
 
         except Exception as e:
             logger.error(f"Erro na geração de pontos: {e}")
             raise
 
-    def _processar_dia(self, dia_semana):
-        pontos_dia = []
-        for turno in range(4):
-            pontos_dia.extend(self._processar_turno(dia_semana, turno))
-        return pontos_dia
+    def _atualizar_objetivos(self, tipos_grade, probabilidades_grade):
+        """Refaz o objetivo de cada parada pela hora atribuída na rota, que pode diferir da hora prevista.
 
-    def _processar_turno(self, dia_semana, turno):
-        pontos_turno = []
-        horario_inicio_turno = turno * 6
+        O local da parada é mantido, pois a rota foi otimizada sobre ele.
+        """
+        df = self.pontos_patrulhamento.df
+        codigos = pd.Index(self.crime_data.label_encoder.classes_).get_indexer(df["BAIRRO"].astype(object))
+        dias = df["DIA_SEMANA"].to_numpy(dtype=np.int64)
+        horas = df["HORARIO_INICIO"].to_numpy(dtype=np.int64) // 60
+        df["OBJETIVO"] = [
+            interpretar_previsoes(tipo, probabilidade, dia, hora)
+            for tipo, probabilidade, dia, hora in zip(
+                tipos_grade[codigos, dias, horas], probabilidades_grade[codigos, dias, horas].tolist(),
+                dias.tolist(), horas.tolist()
+            )
+        ]
 
-        for i in range(6):
-            try:
-                hora = horario_inicio_turno + i
-                bairro = self.crime_data.df.sample(1)["BAIRRO"].iloc[0]
+    def _executar(self, backend, selecao, total_slots):
+        """Divide as paradas em tarefas conforme a granularidade e as executa no backend escolhido.
 
-                # Obter a previsão do modelo
-                tipo_crime, probabilidade_previsao = self.previsores.prever_local_horario(bairro, dia_semana, hora)
-                probabilidade_combinada = self._combinar_probabilidades(
-                    self._calcular_probabilidades(bairro, dia_semana, hora), probabilidade_previsao
-                )
-                objetivo = interpretar_previsoes(tipo_crime, probabilidade_combinada, dia_semana, hora)
-
-                # Calcular o horário de início e término baseado na hora do objetivo
-                horario_inicio = datetime.combine(date.today(), time(hora))
-                horario_fim = horario_inicio + timedelta(minutes=20)
-
-                ponto = {
-                    "DIA_SEMANA": dia_semana,
-                    "HORARIO_INICIO": horario_inicio,
-                    "HORARIO_TERMINO": horario_fim,
-                    "BAIRRO": bairro,
-                    "LOGRADOURO": self.crime_data.df[self.crime_data.df["BAIRRO"] == bairro].sample(1)["LOGRADOURO"].iloc[0],
-                    "LATITUDE": self.crime_data.df[self.crime_data.df["BAIRRO"] == bairro].sample(1)["LATITUDE"].iloc[0],
-                    "LONGITUDE": self.crime_data.df[self.crime_data.df["BAIRRO"] == bairro].sample(1)["LONGITUDE"].iloc[0],
-                    "OBJETIVO": objetivo,
-                    "MISSAO": f"Patrulhamento preventivo em {bairro}",
-                    "OBSERVACAO": ""
-                }
-                pontos_turno.append(ponto)
+        Cada tarefa cobre um dia, um turno ou um horário de uma viatura; as paradas já vêm nessa ordem.
+        """
+        chaves = [np.asarray(selecao["DIA"])]
+        if "VIATURA" in selecao:
+            chaves.append(np.asarray(selecao["VIATURA"]))
+        if self.granularidade == "turno":
+            chaves.append(self.escala.classificar_turnos(selecao["INICIO"]))
+        elif self.granularidade == "horario":
+            chaves.append(np.asarray(selecao["INICIO"]) // self.escala.duracao_slot)
 
-            except Exception as e:
-                logger.warning(f"Erro ao adicionar ponto {i} para o turno {turno}: {e}")
+        mudancas = np.flatnonzero(np.any([chave[1:] != chave[:-1] for chave in chaves], axis=0)) + 1
+        limites = np.concatenate(([0], mudancas, [total_slots]))
+        blocos = [
+            {coluna: valores[inicio:fim] for coluna, valores in selecao.items()}
+            for inicio, fim in zip(limites[:-1].tolist(), limites[1:].tolist())
+        ]
+        sementes = np.random.default_rng(self.semente).integers(0, 2 ** 32, size=len(blocos))
 
-        return pontos_turno
-
-    @lru_cache(maxsize=128)
-    def _calcular_probabilidades(self, bairro, dia_semana, hora):
-        try:
-            tipo_crime, probabilidade = self.previsores.prever_local_horario(bairro, dia_semana, hora)
-            return probabilidade
-        except Exception as e:
-            logger.error(f"Erro ao calcular probabilidades: {e}")
-            raise
+        if backend == "serial":
+            dados = self._tabelas_consulta()
+            resultados = [_processar_slots(dados, bloco, int(semente)) for bloco, semente in zip(blocos, sementes)]
+        elif backend == "threads":
+            dados = self._tabelas_consulta()
+            executor = _obter_executor(backend)
+            resultados = executor.map(_processar_slots, [dados] * len(blocos), blocos, [int(s) for s in sementes])
+        else:
+            # Os processos recebem apenas o descritor dos dados compartilhados e a seleção de cada bloco
+            descritor = self._publicar_dados()
+            executor = _obter_executor(backend)
+            resultados = executor.map(
+                _processar_slots_compartilhados, [descritor] * len(blocos), blocos, [int(s) for s in sementes]
+            )
 
-    def _combinar_probabilidades(self, probabilidade_historica, probabilidade_previsao):
-        return (probabilidade_historica + probabilidade_previsao) / 2
+        return list(resultados)
 
-    def gerar_excel(self, filename):
+    def gerar_excel(self, filename, viatura=None):
         logger.info(f"Iniciando geração do arquivo Excel: {filename}")
 
         try:
-            wb = openpyxl.Workbook()
-
-            for dia_semana in range(7):
-                pontos_dia = [p for p in self.pontos_patrulhamento if p["DIA_SEMANA"] == dia_semana]
-                if not pontos_dia:
-                    continue
-
-                self._criar_aba_excel(wb, dia_semana, pontos_dia)
-
-            wb.remove(wb["Sheet"])
-            wb.save(filename)
+            self._montar_workbook(viatura).save(filename)
             logger.info(f"Arquivo Excel gerado com sucesso: {filename}")
             return filename
 
@@ -128,36 +344,53 @@ class CartaoPrograma:
             logger.error(f"Erro na geração do arquivo Excel: {e}")
             raise
 
-    def _criar_aba_excel(self, wb, dia_semana, pontos_dia):
-        df_patrulhamento = pd.DataFrame(pontos_dia)
-        ws = wb.create_sheet(title=dias_da_semana[dia_semana])
-
-        df_patrulhamento["ORDEM_OCUPACAO"] = range(1, len(df_patrulhamento) + 1)
-        cols = df_patrulhamento.columns.tolist()
-        cols = cols[-1:] + cols[:-1]
-        df_patrulhamento = df_patrulhamento[cols]
-
-        for col in ["HORARIO_INICIO", "HORARIO_TERMINO"]:
-            df_patrulhamento[col] = pd.to_datetime(df_patrulhamento[col]).dt.strftime('%H:%M')
-
-        for row in range(len(df_patrulhamento.index) + 1):
-            for col in range(len(df_patrulhamento.columns)):
-                if row == 0:
-                    ws.cell(row=row + 1, column=col + 1).value = df_patrulhamento.columns[col]
-                else:
-                    ws.cell(row=row + 1, column=col + 1).value = df_patrulhamento.iloc[row - 1, col]
-
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    cell_value = str(cell.value)
-                    if len(cell_value) > max_length:
-                        max_length = len(cell_value)
-                except:
-                    pass
-            adjusted_width = (max_length + 2) * 1.2
-            ws.column_dimensions[column_letter].width = adjusted_width
+    def gerar_excel_viaturas(self, diretorio):
+        """Gera um arquivo Excel por viatura no diretório informado; retorna o caminho de cada viatura."""
+        os.makedirs(diretorio, exist_ok=True)
+        return {
+            viatura: self.gerar_excel(os.path.join(diretorio, f"cartao_{viatura}.xlsx"), viatura)
+            for viatura in self.pontos_patrulhamento.viaturas()
+        }
+
+    def gerar_excel_bytes(self, viatura=None):
+        """Gera o arquivo Excel (de todas as viaturas ou de uma) diretamente em memória, reaproveitando o
+        resultado enquanto os pontos não mudarem."""
+        if viatura not in self._excel_bytes:
+            try:
+                buffer = io.BytesIO()
+                self._montar_workbook(viatura).save(buffer)
+                self._excel_bytes[viatura] = buffer.getvalue()
+                logger.info(f"Arquivo Excel gerado em memória ({len(self._excel_bytes[viatura])} bytes)")
+
+            except Exception as e:
+                logger.error(f"Erro na geração do arquivo Excel: {e}")
+                raise
+        return self._excel_bytes[viatura]
+
+    def _montar_workbook(self, viatura=None):
+        # Modo somente escrita: as linhas são gravadas em sequência, sem manter as células em memória
+        wb = openpyxl.Workbook(write_only=True)
+
+        # Cada aba lê os pontos do dia (da viatura, se informada) diretamente do índice do armazenamento
+        for dia in self.pontos_patrulhamento.dias(viatura):
+            self._criar_aba_excel(wb, dia, self.pontos_patrulhamento.tabela_exportacao(dia, viatura))
+        return wb
+
+    def _criar_aba_excel(self, wb, dia, pontos_dia):
+        ws = wb.create_sheet(title=self.escala.titulo_dia(dia))
+        colunas = list(pontos_dia.columns)
+
+        # Largura de cada coluna pelo maior texto, calculada por coluna
+        larguras = [
+            max(len(coluna), int(pontos_dia[coluna].astype(str).str.len().max())) for coluna in colunas
+        ]
+
+        # No modo somente escrita as larguras precisam ser definidas antes das linhas
+        for indice, largura in enumerate(larguras, start=1):
+            ws.column_dimensions[get_column_letter(indice)].width = (largura + 2) * 1.2
+
+        ws.append(colunas)
+        for linha in pontos_dia.itertuples(index=False, name=None):
+            ws.append([valor.item() if isinstance(valor, np.generic) else valor for valor in linha])
 
         return ws
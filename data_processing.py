@@ -1,41 +1,469 @@
+import hashlib
+import logging
+import os
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 from sklearn.preprocessing import LabelEncoder
+from shift_schedule import TURNOS, turnos_por_hora
+
+logger = logging.getLogger(__name__)
+
+# Colunas do arquivo original usadas pelo sistema
+COLUNAS_ORIGINAIS = [
+    "DATA_FATO", "HORARIO_FATO", "DIA_DA_SEMANA_FATO", "BAIRRO", "LOGRADOURO",
+    "LATITUDE", "LONGITUDE", "DESCR_NATUREZA_PRINCIPAL"
+]
+
+# Colunas mantidas no formato colunar já processado
+COLUNAS_PROCESSADAS = [
+    "DATA_FATO", "HORARIO_FATO", "DIA_SEMANA", "BAIRRO", "BAIRRO_CODIGO",
+    "LOGRADOURO", "LATITUDE", "LONGITUDE", "DESCR_NATUREZA_PRINCIPAL"
+]
+COLUNAS_CATEGORICAS = ["BAIRRO", "LOGRADOURO", "DESCR_NATUREZA_PRINCIPAL"]
+COLUNAS_AGREGADAS = ["BAIRRO", "DIA_SEMANA", "HORARIO_FATO", "DESCR_NATUREZA_PRINCIPAL"]
+
+DIAS_SEMANA = {"SEGUNDA-FEIRA": 0, "TERÇA-FEIRA": 1, "QUARTA-FEIRA": 2, "QUINTA-FEIRA": 3,
+               "SEXTA-FEIRA": 4, "SÁBADO": 5, "DOMINGO": 6}
+
+# Assinaturas dos formatos colunares aceitos
+ASSINATURAS_FORMATOS = {b"PAR1": "parquet", b"ARROW1": "feather"}
+EXTENSOES_FORMATOS = {".parquet": "parquet", ".pq": "parquet", ".feather": "feather", ".arrow": "feather"}
+
+# Índice espacial: lado das células da grade (graus, ~200 m) e meia largura da janela de horas das consultas
+TAMANHO_CELULA = 0.002
+BITS_EIXO_GRADE = 21  # Bits de linha e de coluna da grade na chave de cada célula
+JANELA_HORAS = 1
+
+# Horário no formato HH:MM ou HH:MM:SS
+PADRAO_HORARIO = r"^\s*(\d{1,2}):(\d{2})(?::(\d{2}))?\s*$"
+
+
+def _fatorar(serie):
+    """Separa os valores distintos da série, para que cada um seja convertido uma única vez."""
+    codigos, unicos = pd.factorize(serie)
+    return codigos, pd.Series(np.asarray(unicos, dtype=object))
+
+
+def _expandir(valores_unicos, codigos, valor_ausente):
+    """Distribui os valores convertidos de volta para as linhas; código -1 (nulo) recebe valor_ausente."""
+    return np.append(valores_unicos, np.array([valor_ausente], dtype=valores_unicos.dtype))[codigos]
+
+
+def converter_decimal(serie):
+    """Converte números com vírgula decimal (ex.: '-16,365') em float64, com NaN nos valores inválidos."""
+    codigos, unicos = _fatorar(serie)
+    valores = pd.to_numeric(unicos.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+    return _expandir(valores.to_numpy(dtype=np.float64), codigos, np.nan)
+
+
+def converter_hora(serie):
+    """Extrai a hora (0 a 23) de horários HH:MM:SS, com NaN nos valores inválidos."""
+    codigos, unicos = _fatorar(serie)
+    partes = unicos.astype(str).str.extract(PADRAO_HORARIO).apply(pd.to_numeric)
+    validos = (partes[0] < 24) & (partes[1] < 60) & (partes[2].fillna(0) < 60)
+    return _expandir(partes[0].where(validos).to_numpy(dtype=np.float64), codigos, np.nan)
+
+
+def converter_data(serie, formato="%d/%m/%Y"):
+    """Converte datas no formato informado em datetime64, com NaT nos valores inválidos."""
+    codigos, unicos = _fatorar(serie)
+    valores = pd.to_datetime(unicos, format=formato, errors="coerce")
+    return _expandir(valores.to_numpy(dtype="datetime64[ns]"), codigos, np.datetime64("NaT"))
+
+
+def converter_dia_semana(serie):
+    """Converte o nome do dia da semana no número do dia (segunda = 0), com NaN nos nomes desconhecidos."""
+    codigos, unicos = _fatorar(serie)
+    return _expandir(unicos.map(DIAS_SEMANA).to_numpy(dtype=np.float64), codigos, np.nan)
+
+
+def sortear_enderecos(acumulado_enderecos, base_por_celula, total_por_celula, celulas, rng=None):
+    """Sorteia um endereço para cada célula, com probabilidade proporcional às ocorrências registradas nele
+    (equivale a sortear uma ocorrência da célula e usar o seu endereço). Retorna as posições dos endereços."""
+    rng = rng if rng is not None else np.random.default_rng()
+    celulas = np.asarray(celulas)
+    totais = total_por_celula[celulas]
+    if (totais == 0).any():
+        raise ValueError("Célula sem ocorrências nos dados carregados")
+
+    deslocamentos = (rng.random(len(celulas)) * totais).astype(np.int64)
+    return np.searchsorted(acumulado_enderecos, base_por_celula[celulas] + deslocamentos, side="right")
+
+
+def _estender(valores, tamanho):
+    """Completa o array com zeros no primeiro eixo até o tamanho informado."""
+    extra = np.zeros((tamanho - len(valores),) + valores.shape[1:], dtype=valores.dtype)
+    return np.concatenate([valores, extra])
+
 
 class CrimeData:
     """Classe para armazenar e processar dados de crimes."""
 
-    def __init__(self, csv_file):
-        self.df = pd.read_csv(csv_file, sep=";", encoding="utf-8")  # Especificando o separador ';'
-        self.processar_dados()
+    def __init__(self, arquivo, formato=None, tamanho_bloco=None, tamanho_celula=TAMANHO_CELULA):
+        self.tamanho_celula = tamanho_celula
+        self.linhas_invalidas = None  # Linhas descartadas por valores inválidos, com o motivo
+        self.contagens = None  # Ocorrências por bairro, dia, hora e tipo de crime
+        self.contagens_diarias = None  # Ocorrências por data
+
+        formato = formato or self._detectar_formato(arquivo)
+        if formato != "csv":
+            self._carregar_colunar(arquivo, formato)
+        elif tamanho_bloco:
+            self._carregar_csv_em_blocos(arquivo, tamanho_bloco)
+        else:
+            self.df = pd.read_csv(arquivo, sep=";", encoding="utf-8", usecols=COLUNAS_ORIGINAIS)  # Especificando o separador ';'
+            self.processar_dados()
+
+        self._construir_cubo()
+        self._construir_grade()
+
+    @staticmethod
+    def _detectar_formato(arquivo):
+        """Identifica o formato do arquivo pela extensão ou, para arquivos em memória, pela assinatura."""
+        nome = arquivo if isinstance(arquivo, (str, os.PathLike)) else getattr(arquivo, "name", "")
+        extensao = os.path.splitext(os.fspath(nome))[1].lower() if nome else ""
+        if extensao in EXTENSOES_FORMATOS:
+            return EXTENSOES_FORMATOS[extensao]
+
+        if hasattr(arquivo, "read") and hasattr(arquivo, "seek"):
+            posicao = arquivo.tell()
+            inicio = arquivo.read(8)
+            arquivo.seek(posicao)
+            for assinatura, formato in ASSINATURAS_FORMATOS.items():
+                if inicio.startswith(assinatura):
+                    return formato
+        return "csv"
+
+    def _carregar_colunar(self, arquivo, formato):
+        """Carrega um arquivo Parquet/Feather, dispensando o processamento se ele já estiver convertido."""
+        leitor = pd.read_parquet if formato == "parquet" else pd.read_feather
+        posicao = arquivo.tell() if hasattr(arquivo, "seek") else None
+        try:
+            # Leitura apenas das colunas usadas pelo sistema
+            self.df = leitor(arquivo, columns=COLUNAS_PROCESSADAS)
+        except ValueError:
+            # Arquivo colunar com os dados brutos: segue o mesmo processamento do CSV
+            if posicao is not None:
+                arquivo.seek(posicao)
+            self.df = leitor(arquivo)
+            self.processar_dados()
+            return
+
+        # Reconstrói o label encoder a partir das categorias já salvas (na ordem salva); um arquivo filtrado depois
+        # de salvo ainda lista bairros sem linhas, que são removidos para que todo código tenha ocorrências
+        self.df["BAIRRO"] = self.df["BAIRRO"].astype("category").cat.remove_unused_categories()
+        self.label_encoder = LabelEncoder()
+        self.label_encoder.classes_ = np.asarray(self.df["BAIRRO"].cat.categories, dtype=object)
+        self.df["BAIRRO_CODIGO"] = self.df["BAIRRO"].cat.codes.to_numpy().astype(np.int32)
+        self._acumular_agregados(self.df)
+
+    def _carregar_csv_em_blocos(self, arquivo, tamanho_bloco):
+        """Lê o CSV em blocos, convertendo cada bloco para tipos compactos e acumulando os agregados.
+
+        A leitura em blocos limita o pico do parsing (texto bruto) ao tamanho do bloco, mas os blocos convertidos
+        ainda são concatenados em self.df: a memória final continua proporcional ao número de linhas válidas.
+        """
+        blocos = []
+        leitor = pd.read_csv(arquivo, sep=";", encoding="utf-8", usecols=COLUNAS_ORIGINAIS, chunksize=tamanho_bloco)
+        for bloco in leitor:
+            bloco = self._converter_tipos(bloco)
+            if bloco.empty:
+                continue
+            self._acumular_agregados(bloco)
+            blocos.append(bloco)
+        if not blocos:
+            raise ValueError("Nenhuma linha válida encontrada no arquivo")
+
+        # Unifica as categorias dos blocos para concatená-los sem voltar a colunas de texto; blocos com a coluna
+        # inteiramente vazia trazem categorias float, por isso todas são convertidas para object antes da união
+        for coluna in COLUNAS_CATEGORICAS:
+            for bloco in blocos:
+                bloco[coluna] = bloco[coluna].cat.set_categories(bloco[coluna].cat.categories.astype(object))
+            categorias = union_categoricals([bloco[coluna] for bloco in blocos]).categories.sort_values()
+            for bloco in blocos:
+                bloco[coluna] = bloco[coluna].cat.set_categories(categorias)
+        self.df = pd.concat(blocos, ignore_index=True)
+        del blocos
+
+        self._codificar_bairros()
 
     def processar_dados(self):
         """Valida e processa os dados de crimes."""
-        # Convertendo colunas para os tipos corretos
-        self.df["DATA_FATO"] = pd.to_datetime(self.df["DATA_FATO"], format="%d/%m/%Y")
-        self.df["HORARIO_FATO"] = pd.to_datetime(self.df["HORARIO_FATO"], format="%H:%M:%S").dt.hour
-        self.df["DIA_DA_SEMANA_NUMERICO"] = self.df["DIA_DA_SEMANA_FATO"].map(
-            {"SEGUNDA-FEIRA": 0, "TERÇA-FEIRA": 1, "QUARTA-FEIRA": 2, "QUINTA-FEIRA": 3,
-             "SEXTA-FEIRA": 4, "SÁBADO": 5, "DOMINGO": 6}
-        )
-
-        # Renomeando colunas para melhor legibilidade
-        self.df.rename(columns={"DIA_DA_SEMANA_NUMERICO": "DIA_SEMANA"}, inplace=True)
+        self.linhas_invalidas = None
+        self.df = self._converter_tipos(self.df).reset_index(drop=True)
 
         # Validação básica (adicionar mais validações conforme necessário)
         #self.df = self.df[self.df["LATITUDE"] != -16.36506]  # Excluir dados inválidos (latitude -16.36506)
 
-        # Salvando o mapeamento de bairros para o label encoding
+        self._codificar_bairros()
+        self.contagens = self.contagens_diarias = None
+        self._acumular_agregados(self.df)
+
+    def _converter_tipos(self, df):
+        """Converte as colunas usadas pelo sistema para tipos compactos, descarta as demais e separa as linhas inválidas."""
+        convertido = pd.DataFrame(index=df.index)
+        convertido["DATA_FATO"] = converter_data(df["DATA_FATO"])
+        horas = converter_hora(df["HORARIO_FATO"])
+
+        # Dia da semana numérico a partir do nome do dia
+        dias = converter_dia_semana(df["DIA_DA_SEMANA_FATO"])
+
+        for coluna in COLUNAS_CATEGORICAS:
+            convertido[coluna] = df[coluna].astype("category")
+
+        # Convertendo as coordenadas para números, tratando a vírgula como separador decimal
+        latitudes = converter_decimal(df["LATITUDE"])
+        longitudes = converter_decimal(df["LONGITUDE"])
+
+        invalidos = pd.DataFrame({
+            "DATA_FATO": convertido["DATA_FATO"].isna().to_numpy(),
+            "HORARIO_FATO": np.isnan(horas),
+            "DIA_DA_SEMANA_FATO": np.isnan(dias),
+            "BAIRRO": convertido["BAIRRO"].isna().to_numpy(),
+            "LATITUDE": np.isnan(latitudes),
+            "LONGITUDE": np.isnan(longitudes)
+        }, index=df.index)
+        linhas_invalidas = invalidos.any(axis=1).to_numpy()
+        if linhas_invalidas.any():
+            self._registrar_linhas_invalidas(df[linhas_invalidas], invalidos[linhas_invalidas])
+
+        validas = ~linhas_invalidas
+        convertido = convertido[validas]
+        convertido.insert(1, "HORARIO_FATO", horas[validas].astype("int8"))
+        convertido.insert(2, "DIA_SEMANA", dias[validas].astype("int8"))
+        convertido["LATITUDE"] = latitudes[validas].astype("float32")
+        convertido["LONGITUDE"] = longitudes[validas].astype("float32")
+        return convertido
+
+    def _registrar_linhas_invalidas(self, linhas, invalidos):
+        """Guarda as linhas descartadas, indicando as colunas com valores inválidos."""
+        linhas = linhas.copy()
+        linhas["MOTIVO"] = invalidos.apply(lambda linha: ", ".join(linha.index[linha]), axis=1)
+        self.linhas_invalidas = linhas if self.linhas_invalidas is None else pd.concat([self.linhas_invalidas, linhas])
+        logger.warning(f"{len(linhas)} linhas com valores inválidos foram descartadas")
+
+    def _codificar_bairros(self):
+        """Ajusta o label encoder dos bairros e gera os códigos a partir das categorias da coluna."""
+        # Bairros presentes apenas em linhas descartadas não recebem código
+        self.df["BAIRRO"] = self.df["BAIRRO"].cat.remove_unused_categories()
+        categorias = self.df["BAIRRO"].cat.categories
         self.label_encoder = LabelEncoder()
-        self.label_encoder.fit(self.df["BAIRRO"])
-        self.df["BAIRRO_CODIGO"] = self.label_encoder.transform(self.df["BAIRRO"])
+        self.label_encoder.fit(categorias)
+        codigos_categorias = self.label_encoder.transform(categorias).astype(np.int32)
+        self.df["BAIRRO_CODIGO"] = codigos_categorias[self.df["BAIRRO"].cat.codes.to_numpy()]
+
+    def anexar(self, arquivo, formato=None):
+        """Incorpora novas ocorrências aos dados carregados, processando apenas as linhas novas."""
+        formato = formato or self._detectar_formato(arquivo)
+        if formato == "csv":
+            bruto = pd.read_csv(arquivo, sep=";", encoding="utf-8", usecols=COLUNAS_ORIGINAIS)
+        else:
+            leitor = pd.read_parquet if formato == "parquet" else pd.read_feather
+            bruto = leitor(arquivo, columns=COLUNAS_ORIGINAIS)
+
+        novos = self._converter_tipos(bruto).reset_index(drop=True)
+        if novos.empty:
+            logger.warning("Nenhuma linha válida encontrada nas novas ocorrências")
+            return novos
+
+        # Novas categorias entram no fim, preservando os códigos já atribuídos (inclusive os dos bairros)
+        novos["BAIRRO"] = novos["BAIRRO"].cat.remove_unused_categories()
+        for coluna in COLUNAS_CATEGORICAS:
+            atuais = pd.Index(self.label_encoder.classes_) if coluna == "BAIRRO" else self.df[coluna].cat.categories
+            adicionais = novos[coluna].cat.categories.difference(atuais)
+            categorias = atuais.append(adicionais)
+            self.df[coluna] = self.df[coluna].cat.set_categories(categorias)
+            novos[coluna] = novos[coluna].cat.set_categories(categorias)
+            if coluna == "BAIRRO" and len(adicionais):
+                self.label_encoder.classes_ = np.asarray(categorias, dtype=object)
+                logger.info(f"{len(adicionais)} novos bairros adicionados à codificação")
+        novos["BAIRRO_CODIGO"] = novos["BAIRRO"].cat.codes.to_numpy().astype(np.int32)
+
+        self.df = pd.concat([self.df, novos[self.df.columns]], ignore_index=True)
+        self._acumular_agregados(novos)
+        self._construir_cubo()
+        self._atualizar_grade(novos)
+
+        logger.info(f"{len(novos)} novas ocorrências anexadas ({len(self.df)} no total)")
+        return novos
+
+    def _construir_cubo(self):
+        """Monta, a partir dos agregados, o cubo de contagens bairro x dia x hora x tipo de crime."""
+        niveis = self.contagens.index
+        self.tipos_crime = np.asarray(sorted(niveis.get_level_values("DESCR_NATUREZA_PRINCIPAL").unique()), dtype=object)
+        bairros = pd.Index(self.label_encoder.classes_).get_indexer(niveis.get_level_values("BAIRRO"))
+        tipos = pd.Index(self.tipos_crime).get_indexer(niveis.get_level_values("DESCR_NATUREZA_PRINCIPAL"))
+        dias = niveis.get_level_values("DIA_SEMANA").to_numpy(dtype=np.int64)
+        horas = niveis.get_level_values("HORARIO_FATO").to_numpy(dtype=np.int64)
+
+        forma = (len(self.label_encoder.classes_), 7, 24, len(self.tipos_crime))
+        posicoes = np.ravel_multi_index((bairros, dias, horas, tipos), forma)
+        self.cubo = np.bincount(posicoes, weights=self.contagens.to_numpy(), minlength=int(np.prod(forma)))
+        self.cubo = self.cubo.astype(np.int32).reshape(forma)
+        self._impressao_digital = None
+
+    def _construir_grade(self):
+        """Indexa as ocorrências em uma grade regular dentro de cada bairro e pré-calcula a célula mais densa
+        de cada bairro x dia x hora (janela de ±JANELA_HORAS horas)."""
+        self._chaves_celulas = pd.Index(np.empty(0, dtype=np.int64))
+        self.bairro_da_celula = np.empty(0, dtype=np.int32)
+        self.total_por_celula = np.empty(0, dtype=np.int64)
+        self.contagens_celula = np.empty((0, 168), dtype=np.int32)  # Ocorrências por célula x hora da semana
+        self._somas_coordenadas = np.empty((0, 2), dtype=np.float64)
+        self._enderecos = pd.Series(dtype=np.int64)  # Ocorrências por (célula, logradouro)
+        self._atualizar_grade(self.df)
+
+    def _celulas_das_linhas(self, df):
+        """Célula de cada linha, criando as células ainda não vistas no fim da numeração."""
+        # Chave da célula: bairro, linha e coluna da grade (absoluta, sem depender dos dados já carregados)
+        # empacotados em um inteiro, com BITS_EIXO_GRADE bits para cada eixo
+        mascara = (1 << BITS_EIXO_GRADE) - 1
+        linhas = np.floor(df["LATITUDE"].to_numpy(dtype=np.float64) / self.tamanho_celula).astype(np.int64)
+        colunas = np.floor(df["LONGITUDE"].to_numpy(dtype=np.float64) / self.tamanho_celula).astype(np.int64)
+        chaves = (df["BAIRRO_CODIGO"].to_numpy(dtype=np.int64) << (2 * BITS_EIXO_GRADE)) \
+            | ((linhas & mascara) << BITS_EIXO_GRADE) | (colunas & mascara)
+        celulas = self._chaves_celulas.get_indexer(chaves)
+
+        novas = celulas < 0
+        if novas.any():
+            codigos_novas, chaves_novas = pd.factorize(chaves[novas])
+            celulas[novas] = len(self._chaves_celulas) + codigos_novas
+            self._chaves_celulas = self._chaves_celulas.append(pd.Index(chaves_novas))
+        return celulas
 
-        # Convertendo as coordenadas para números do tipo float, tratando a vírgula como separador decimal
-        self.df['LATITUDE'] = self.df['LATITUDE'].astype(str).str.replace(',', '.', regex=False).astype(float, errors='ignore')
-        self.df['LONGITUDE'] = self.df['LONGITUDE'].astype(str).str.replace(',', '.', regex=False).astype(float, errors='ignore')
+    def _atualizar_grade(self, df):
+        """Soma as ocorrências de `df` às contagens da grade, com custo proporcional às linhas novas e ao número
+        de células (o histórico não é relido)."""
+        celulas = self._celulas_das_linhas(df)
+        n_celulas = len(self._chaves_celulas)
+        self.bairro_da_celula = (self._chaves_celulas.to_numpy() >> (2 * BITS_EIXO_GRADE)).astype(np.int32)
 
+        # Totais, centros (média das coordenadas das ocorrências) e contagens por hora da semana de cada célula
+        self.total_por_celula = _estender(self.total_por_celula, n_celulas) + np.bincount(celulas, minlength=n_celulas)
+        self._somas_coordenadas = _estender(self._somas_coordenadas, n_celulas)
+        for eixo, coluna in enumerate(["LATITUDE", "LONGITUDE"]):
+            self._somas_coordenadas[:, eixo] += np.bincount(
+                celulas, weights=df[coluna].to_numpy(dtype=np.float64), minlength=n_celulas
+            )
+        self.latitude_celula = self._somas_coordenadas[:, 0] / self.total_por_celula
+        self.longitude_celula = self._somas_coordenadas[:, 1] / self.total_por_celula
+
+        horarios = df["DIA_SEMANA"].to_numpy(dtype=np.int64) * 24 + df["HORARIO_FATO"].to_numpy(dtype=np.int64)
+        self.contagens_celula = _estender(self.contagens_celula, n_celulas)
+        self.contagens_celula += np.bincount(celulas * 168 + horarios, minlength=n_celulas * 168).reshape(-1, 168) \
+            .astype(np.int32)
+
+        # Endereços de cada célula ordenados por célula, com as contagens acumuladas usadas no sorteio
+        logradouros = df["LOGRADOURO"].astype(object).fillna("")
+        enderecos = logradouros.groupby([celulas, logradouros.to_numpy()]).size()
+        self._enderecos = self._enderecos.add(enderecos, fill_value=0).astype(np.int64).sort_index()
+        codigos_logradouros, self.logradouros = pd.factorize(self._enderecos.index.get_level_values(1))
+        self.logradouros = np.asarray(self.logradouros, dtype=str)
+        self.logradouro_endereco = codigos_logradouros.astype(np.int32)
+        self.acumulado_enderecos = np.cumsum(self._enderecos.to_numpy())
+        self.base_por_celula = np.concatenate(([0], np.cumsum(self.total_por_celula)[:-1]))
+
+        self._calcular_celulas_densas()
+
+    def _calcular_celulas_densas(self):
+        """Célula de maior contagem de cada bairro x dia x hora, somada na janela de horas vizinhas."""
+        # O deslocamento no eixo de 168 horas faz a janela atravessar a meia-noite para o dia seguinte
+        # (e de domingo para segunda)
+        contagens = self.contagens_celula.astype(np.float32)
+        janela = sum(np.roll(contagens, deslocamento, axis=1) for deslocamento in range(-JANELA_HORAS, JANELA_HORAS + 1))
+        janela = janela.reshape(-1, 7, 24)
+
+        # Empates (inclusive janelas sem ocorrências) desfeitos pelo total da célula
+        janela += (self.total_por_celula / (self.total_por_celula.max() + 1)).astype(np.float32)[:, None, None]
+
+        # Células agrupadas por bairro: máximo por grupo e primeira célula que o atinge
+        ordem = np.argsort(self.bairro_da_celula, kind="stable")
+        janela, bairros = janela[ordem], self.bairro_da_celula[ordem]
+        inicio_bairros = np.searchsorted(bairros, np.arange(len(self.label_encoder.classes_)))
+        maximos = np.maximum.reduceat(janela, inicio_bairros, axis=0)
+        posicoes = np.where(janela == maximos[bairros], np.arange(len(janela), dtype=np.int64)[:, None, None], len(janela))
+        self.celula_mais_densa = ordem[np.minimum.reduceat(posicoes, inicio_bairros, axis=0)].astype(np.int32)
+
+    def consultar_celulas(self, bairros_codigos, dias, horas):
+        """Célula mais densa de cada (bairro, dia, hora) consultado, por indexação no índice pré-calculado."""
+        return self.celula_mais_densa[np.asarray(bairros_codigos), np.asarray(dias), np.asarray(horas)]
+
+    @property
+    def impressao_digital(self):
+        """Hash dos agregados, que identifica o conteúdo dos dados para os caches de figuras."""
+        if self._impressao_digital is None:
+            hash_dados = hashlib.blake2b(digest_size=16)
+            hash_dados.update(np.ascontiguousarray(self.cubo).tobytes())
+            hash_dados.update("\x1f".join(map(str, self.label_encoder.classes_)).encode("utf-8"))
+            hash_dados.update("\x1f".join(map(str, self.tipos_crime)).encode("utf-8"))
+            hash_dados.update(self.contagens_diarias.index.to_numpy(dtype="datetime64[ns]").tobytes())
+            hash_dados.update(self.contagens_diarias.to_numpy(dtype=np.int64).tobytes())
+            self._impressao_digital = hash_dados.hexdigest()
+        return self._impressao_digital
+
+    def contar(self, por, bairros=None, dias=None, horas=None, turnos=TURNOS):
+        """Soma o cubo de contagens mantendo apenas o eixo `por`, com filtros opcionais de bairros, dias e horas.
+
+        Com `por="TURNO"`, as horas são agrupadas nos `turnos` informados; horas fora de qualquer turno são ignoradas.
+        """
+        if por == "TURNO":
+            # Agrupa as contagens por hora nos turnos por consulta em tabela, sem tocar nas linhas
+            por_hora = self.contar("HORARIO_FATO", bairros, dias, horas)
+            codigos = turnos_por_hora(turnos)[por_hora.index.to_numpy()]
+            turnos = pd.Categorical.from_codes(codigos, categories=[nome for nome, _, _ in turnos])
+            return por_hora.groupby(turnos, observed=False).sum().rename_axis("TURNO")
+
+        eixos = {"BAIRRO": 0, "DIA_SEMANA": 1, "HORARIO_FATO": 2, "DESCR_NATUREZA_PRINCIPAL": 3}
+        rotulos = [self.label_encoder.classes_, np.arange(7), np.arange(24), self.tipos_crime]
+
+        cubo = self.cubo
+        if bairros is not None:
+            cubo = cubo[self.label_encoder.transform(np.atleast_1d(bairros))]
+            rotulos[0] = np.atleast_1d(bairros)
+        if dias is not None:
+            cubo = cubo[:, np.atleast_1d(dias)]
+            rotulos[1] = np.atleast_1d(dias)
+        if horas is not None:
+            cubo = cubo[:, :, np.atleast_1d(horas)]
+            rotulos[2] = np.atleast_1d(horas)
+
+        eixo = eixos[por]
+        totais = cubo.sum(axis=tuple(i for i in range(4) if i != eixo), dtype=np.int64)
+        return pd.Series(totais, index=pd.Index(rotulos[eixo], name=por), name="TOTAL")
+
+    def _acumular_agregados(self, bloco):
+        """Soma as contagens do bloco aos agregados usados pelos relatórios e gráficos."""
+        contagens = bloco.groupby(COLUNAS_AGREGADAS, observed=True).size()
+        contagens_diarias = bloco.groupby("DATA_FATO").size()
+        if self.contagens is None:
+            self.contagens, self.contagens_diarias = contagens, contagens_diarias
+        else:
+            self.contagens = self.contagens.add(contagens, fill_value=0).astype("int64")
+            self.contagens_diarias = self.contagens_diarias.add(contagens_diarias, fill_value=0).astype("int64")
+
+    def salvar_colunar(self, caminho, formato=None):
+        """Salva os dados já processados em Parquet/Feather tipado, para cargas futuras sem parsing."""
+        formato = formato or EXTENSOES_FORMATOS.get(os.path.splitext(os.fspath(caminho))[1].lower(), "parquet")
+
+        df = self.df[COLUNAS_PROCESSADAS].copy()
+        df["HORARIO_FATO"] = df["HORARIO_FATO"].astype("int8")
+        df["DIA_SEMANA"] = df["DIA_SEMANA"].astype("int8")
+        df["BAIRRO_CODIGO"] = df["BAIRRO_CODIGO"].astype("int32")
+        for coluna in COLUNAS_CATEGORICAS:
+            df[coluna] = df[coluna].astype("category")
+        # Categorias dos bairros na mesma ordem dos códigos do label encoder
+        df["BAIRRO"] = df["BAIRRO"].cat.set_categories(self.label_encoder.classes_)
+
+        if formato == "feather":
+            df.reset_index(drop=True).to_feather(caminho)
+        else:
+            df.to_parquet(caminho, index=False)
+        return caminho
 
     def gerar_relatorio(self):
         """Gera relatório com estatísticas dos crimes."""
-        # Criar relatório com estatísticas (e.g., crimes por bairro, dia da semana, hora)
-        # Retornar o relatório para ser exibido na interface do usuário
-        return self.df.groupby(["BAIRRO", "DIA_SEMANA", "HORARIO_FATO"])["DESCR_NATUREZA_PRINCIPAL"].count().reset_index()
\ No newline at end of file
+        # Relatório (crimes por bairro, dia da semana e hora) derivado dos agregados já calculados
+        relatorio = self.contagens.groupby(level=["BAIRRO", "DIA_SEMANA", "HORARIO_FATO"], observed=True).sum()
+        return relatorio.rename("DESCR_NATUREZA_PRINCIPAL").reset_index()
+
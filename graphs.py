@@ -1,6 +1,10 @@
+import threading
+from collections import OrderedDict
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 import pandas as pd
+from shift_schedule import Escala
 from utils import dias_da_semana  # Importa o mapeamento
 
 # Definindo as cores padrão
@@ -12,10 +16,54 @@ CORES = {
 }
 
 
+class CacheFiguras:
+    """Cache LRU das figuras já montadas (em JSON), limitado pelo total de bytes armazenados."""
 
-def create_neighborhood_crime_graph(data):
+    def __init__(self, tamanho_maximo=64 * 1024 ** 2):
+        self.tamanho_maximo = tamanho_maximo
+        self.tamanho_atual = 0
+        self._figuras = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, construtor, crime_data, **parametros):
+        """Retorna a figura do construtor para os dados e parâmetros, montando-a apenas na primeira vez."""
+        chave = (crime_data.impressao_digital, construtor.__name__, tuple(sorted(parametros.items())))
+        with self._lock:
+            figura_json = self._figuras.get(chave)
+            if figura_json is not None:
+                self._figuras.move_to_end(chave)
+
+        if figura_json is None:
+            figura_json = construtor(crime_data, **parametros).to_json()
+            self._guardar(chave, figura_json)
+        return pio.from_json(figura_json)
+
+    def _guardar(self, chave, figura_json):
+        with self._lock:
+            if chave in self._figuras:
+                return
+            self._figuras[chave] = figura_json
+            self.tamanho_atual += len(figura_json)
+
+            # Descarta as figuras usadas há mais tempo até respeitar o limite
+            while self.tamanho_atual > self.tamanho_maximo and len(self._figuras) > 1:
+                _, removida = self._figuras.popitem(last=False)
+                self.tamanho_atual -= len(removida)
+
+    def limpar(self):
+        with self._lock:
+            self._figuras.clear()
+            self.tamanho_atual = 0
+
+
+# Cache compartilhado por todas as sessões do servidor
+cache_figuras = CacheFiguras()
+
+
+
+def create_neighborhood_crime_graph(crime_data):
     # Ordena os dados por quantidade de crimes
-    dados_ordenados = data.groupby('BAIRRO')['DESCR_NATUREZA_PRINCIPAL'].count().sort_values(ascending=True).tail(10)
+    dados_ordenados = crime_data.contar('BAIRRO').sort_values(ascending=True).tail(10)
     
     fig_bairro = go.Figure()
     fig_bairro.add_trace(go.Bar(
@@ -48,8 +96,8 @@ def create_neighborhood_crime_graph(data):
     return fig_bairro
 
 
-def create_crime_type_pareto_graph(data):
-    crimes_count = data['DESCR_NATUREZA_PRINCIPAL'].value_counts().head(10)
+def create_crime_type_pareto_graph(crime_data):
+    crimes_count = crime_data.contar('DESCR_NATUREZA_PRINCIPAL').sort_values(ascending=False, kind='stable').head(10)
     cum_percent = crimes_count.cumsum() / crimes_count.sum() * 100
     
     fig_pareto = go.Figure()
@@ -107,14 +155,13 @@ def create_crime_type_pareto_graph(data):
     )
     return fig_pareto
 
-def create_crime_trend_graph(data):
-    crimes_por_data = data.groupby('DATA_FATO')['DESCR_NATUREZA_PRINCIPAL'].count().reset_index()
-    crimes_por_data['DATA_FATO'] = pd.to_datetime(crimes_por_data['DATA_FATO'])
+def create_crime_trend_graph(crime_data):
+    crimes_por_data = crime_data.contagens_diarias.sort_index()
     
     fig_tendencia = go.Figure()
     fig_tendencia.add_trace(go.Scatter(
-        x=crimes_por_data['DATA_FATO'],
-        y=crimes_por_data['DESCR_NATUREZA_PRINCIPAL'],
+        x=pd.to_datetime(crimes_por_data.index),
+        y=crimes_por_data.values,
         mode='lines',
         line=dict(color=CORES['secundaria']),
         fill='tozeroy',
@@ -142,19 +189,12 @@ def create_crime_trend_graph(data):
     )
     return fig_tendencia
 
-def create_shift_crime_graph(data):
-    def classificar_turno(hora):
-        if 0 <= hora < 6:
-            return 'Madrugada<br>(00h-06h)'
-        elif 6 <= hora < 12:
-            return 'Manhã<br>(06h-12h)'
-        elif 12 <= hora < 18:
-            return 'Tarde<br>(12h-18h)'
-        else:
-            return 'Noite<br>(18h-00h)'
-    
-    data['TURNO'] = data['HORARIO_FATO'].apply(classificar_turno)
-    crimes_por_turno = data['TURNO'].value_counts()
+def create_shift_crime_graph(crime_data, escala=None):
+    # Contagens pelos turnos da escala já agregadas a partir do cubo, sem alterar os dados
+    turnos = (escala if escala is not None else Escala()).turnos
+    crimes_por_turno = crime_data.contar('TURNO', turnos=turnos)
+    crimes_por_turno.index = [f'{nome}<br>({inicio:02d}h-{fim % 24:02d}h)' for nome, inicio, fim in turnos]
+    crimes_por_turno = crimes_por_turno[crimes_por_turno > 0].sort_values(ascending=False)
     
     fig_pizza = go.Figure()
     fig_pizza.add_trace(go.Pie(
@@ -173,8 +213,9 @@ def create_shift_crime_graph(data):
     )
     return fig_pizza
 
-def create_hourly_crime_graph(data):
-    crimes_por_hora = data['HORARIO_FATO'].value_counts().sort_index()
+def create_hourly_crime_graph(crime_data):
+    crimes_por_hora = crime_data.contar('HORARIO_FATO')
+    crimes_por_hora = crimes_por_hora[crimes_por_hora > 0]
 
     fig_horario = go.Figure()
     fig_horario.add_trace(go.Bar(
@@ -218,9 +259,10 @@ def create_hourly_crime_graph(data):
 
 
 
-def create_weekday_crime_graph(data):
+def create_weekday_crime_graph(crime_data):
     # Contagem de ocorrências por dia da semana
-    crimes_por_dia = data['DIA_SEMANA'].value_counts().sort_index()
+    crimes_por_dia = crime_data.contar('DIA_SEMANA')
+    crimes_por_dia = crimes_por_dia[crimes_por_dia > 0]
 
     # Mapeia o índice numérico para o nome do dia
     crimes_por_dia.index = crimes_por_dia.index.map(dias_da_semana)
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+def pontuar_horarios(cubo, probabilidades, suavizacao=1.0):
+    """Pontuação bairro x dia x hora: ocorrências históricas (suavizadas pela média do bairro) x probabilidade do modelo."""
+    contagens = np.asarray(cubo).sum(axis=3, dtype=np.float64)
+    media_bairro = contagens.mean(axis=(1, 2), keepdims=True)
+    return (contagens + suavizacao * media_bairro) * probabilidades
+
+
+def selecionar_hotspots(pontuacao, turno_slots, posicao_slots, k=1, semente=None):
+    """Escolhe os k bairros de maior pontuação em cada (dia, slot), sem repetir bairros no mesmo turno do dia.
+
+    `pontuacao` tem o formato bairro x dia x slot; `turno_slots` e `posicao_slots` dão o turno de cada slot
+    e sua posição dentro do turno (ver Escala). Retorna os códigos dos bairros no formato (dias, slots, k).
+    Empates são desfeitos pela semente. Com menos bairros que k, os bairros se repetem no mesmo slot.
+    """
+    n_bairros, n_dias, n_slots = pontuacao.shape
+    if k < 1 or n_bairros < 1:
+        raise ValueError(f"Quantidade de pontos por horário inválida: {k} (bairros disponíveis: {n_bairros})")
+    k, k_pedido = min(k, n_bairros), k
+    turno_slots, posicao_slots = np.asarray(turno_slots), np.asarray(posicao_slots)
+
+    # Pontuação no formato dia x slot x bairro, com um desempate mínimo e reprodutível
+    rng = np.random.default_rng(semente)
+    pontuacao = np.moveaxis(np.asarray(pontuacao, dtype=np.float64), 0, -1)
+    pontuacao = pontuacao + rng.random(pontuacao.shape) * 1e-9 * (np.abs(pontuacao).max() + 1)
+
+    escolhidos = np.empty((n_dias, n_slots, k), dtype=np.int64)
+    usados = np.zeros((n_dias, turno_slots.max() + 1, n_bairros), dtype=bool)
+
+    # Escolha gulosa slot a slot dentro do turno, vetorizada sobre todos os dias e turnos de cada vez
+    for posicao in range(posicao_slots.max() + 1):
+        slots = np.flatnonzero(posicao_slots == posicao)
+        turnos = turno_slots[slots]
+        candidatos = pontuacao[:, slots, :]
+        disponiveis = ~usados[:, turnos, :]
+        restritos = np.where(disponiveis, candidatos, -np.inf)
+
+        # Turnos sem k bairros livres voltam a aceitar repetições
+        esgotados = disponiveis.sum(axis=-1) < k
+        restritos[esgotados] = candidatos[esgotados]
+
+        melhores = np.argpartition(-restritos, k - 1, axis=-1)[..., :k]
+        ordem = np.argsort(-np.take_along_axis(restritos, melhores, axis=-1), axis=-1, kind="stable")
+        melhores = np.take_along_axis(melhores, ordem, axis=-1)
+        escolhidos[:, slots, :] = melhores
+
+        marcados = np.zeros_like(disponiveis)
+        np.put_along_axis(marcados, melhores, True, axis=-1)
+        usados[:, turnos, :] |= marcados
+
+    # Bairros insuficientes para o slot: os escolhidos voltam a ser visitados, na mesma ordem de pontuação
+    return escolhidos[..., np.arange(k_pedido) % k]
@@ -0,0 +1,68 @@
+import folium
+from folium.plugins import FastMarkerCluster, HeatMap
+import numpy as np
+from patrol_points import formatar_horarios
+from utils import dias_da_semana
+
+# Camadas de ocorrências históricas disponíveis no mapa base
+CAMADAS_HISTORICAS = {"calor": "Mapa de calor", "agrupamento": "Agrupamento de ocorrências"}
+
+# Limite de ocorrências enviadas ao navegador; acima disso é usada uma amostra fixa
+MAXIMO_OCORRENCIAS_MAPA = 200_000
+
+
+def coordenadas_ocorrencias(crime_data, maximo=MAXIMO_OCORRENCIAS_MAPA, semente=0):
+    """Coordenadas [lat, lon] das ocorrências, amostradas de forma determinística acima do limite."""
+    coordenadas = np.column_stack([
+        crime_data.df["LATITUDE"].to_numpy(dtype=np.float64),
+        crime_data.df["LONGITUDE"].to_numpy(dtype=np.float64)
+    ])
+    if len(coordenadas) > maximo:
+        amostra = np.random.default_rng(semente).choice(len(coordenadas), size=maximo, replace=False)
+        coordenadas = coordenadas[np.sort(amostra)]
+    return coordenadas.round(5)
+
+
+def criar_mapa_base(crime_data, camadas=("calor",)):
+    """Mapa base do conjunto de dados, com as ocorrências históricas enviadas em bloco nas camadas escolhidas."""
+    coordenadas = coordenadas_ocorrencias(crime_data)
+    centro = np.median(coordenadas, axis=0).tolist()
+    mapa = folium.Map(location=centro, zoom_start=13, tiles='OpenStreetMap')
+
+    lista_coordenadas = coordenadas.tolist()
+    if "calor" in camadas:
+        HeatMap(lista_coordenadas, name=CAMADAS_HISTORICAS["calor"], radius=12, blur=15).add_to(mapa)
+    if "agrupamento" in camadas:
+        FastMarkerCluster(lista_coordenadas, name=CAMADAS_HISTORICAS["agrupamento"]).add_to(mapa)
+    return mapa
+
+
+def criar_camada_pontos(pontos):
+    """Camada GeoJSON com os pontos de patrulhamento, montada de uma só vez a partir do DataFrame filtrado."""
+    inicios = formatar_horarios(pontos["HORARIO_INICIO"])
+    terminos = formatar_horarios(pontos["HORARIO_TERMINO"])
+    viaturas = [f"<b>Viatura:</b> {viatura}<br>" for viatura in pontos["VIATURA"].tolist()] \
+        if "VIATURA" in pontos.columns else [""] * len(pontos)
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [longitude, latitude]},
+            "properties": {
+                "popup": (f"{viatura}<b>Dia:</b> {dias_da_semana[dia]}<br>"
+                          f"<b>Horário:</b> {inicio} - {termino}<br>"
+                          f"<b>Bairro:</b> {bairro}<br><b>Objetivo:</b> {objetivo}")
+            }
+        }
+        for viatura, dia, inicio, termino, bairro, objetivo, latitude, longitude in zip(
+            viaturas, pontos["DIA_SEMANA"].tolist(), inicios, terminos, pontos["BAIRRO"].tolist(),
+            pontos["OBJETIVO"].tolist(), pontos["LATITUDE"].tolist(), pontos["LONGITUDE"].tolist()
+        )
+    ]
+
+    camada = folium.FeatureGroup(name="Pontos de patrulhamento")
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        marker=folium.Marker(icon=folium.Icon(color="blue")),
+        popup=folium.GeoJsonPopup(fields=["popup"], labels=False)
+    ).add_to(camada)
+    return camada
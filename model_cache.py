@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+class CacheModelos:
+    """Cache em disco dos dados processados e modelos treinados, indexado pelo hash do arquivo de dados."""
+
+    EXTENSAO = ".pkl"
+    # Versão do formato dos objetos guardados (CrimeData, PrevisorCrime); deve ser incrementada sempre que os
+    # atributos dessas classes mudarem, para que entradas antigas não sejam carregadas
+    VERSAO_ESQUEMA = 3
+
+    def __init__(self, diretorio=".cache_modelos", tamanho_maximo=1024 ** 3):
+        self.diretorio = diretorio
+        self.tamanho_maximo = tamanho_maximo  # Tamanho máximo do cache em bytes
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._locks_chaves = {}
+
+    @staticmethod
+    def calcular_chave(conteudo):
+        """Calcula a impressão digital (SHA-256) do conteúdo do arquivo de dados."""
+        return hashlib.sha256(conteudo).hexdigest()
+
+    @classmethod
+    def calcular_chave_modelo(cls, conteudo, **parametros):
+        """Chave de uma entrada do cache: conteúdo do arquivo, versão do formato e parâmetros do treino."""
+        contexto = f"v{cls.VERSAO_ESQUEMA};" + ";".join(f"{nome}={valor!r}" for nome, valor in sorted(parametros.items()))
+        return cls.calcular_chave(contexto.encode("utf-8") + b"\0" + conteudo)
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave + self.EXTENSAO)
+
+    def _lock_chave(self, chave):
+        with self._lock:
+            return self._locks_chaves.setdefault(chave, threading.Lock())
+
+    def obter(self, chave):
+        """Retorna o objeto armazenado para a chave, ou None se não estiver em cache."""
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "rb") as arquivo:
+                objeto = pickle.load(arquivo)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Entrada de cache inválida descartada ({chave}): {e}")
+            self._remover(caminho)
+            return None
+
+        # Atualiza a data de modificação para marcar o uso recente (LRU)
+        try:
+            os.utime(caminho)
+        except FileNotFoundError:
+            pass
+        return objeto
+
+    def salvar(self, chave, objeto):
+        """Grava o objeto de forma atômica e aplica o limite de tamanho do cache."""
+        descritor, caminho_temporario = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        try:
+            with os.fdopen(descritor, "wb") as arquivo:
+                pickle.dump(objeto, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(caminho_temporario, self._caminho(chave))
+        except Exception:
+            self._remover(caminho_temporario)
+            raise
+        self._remover_excedentes()
+
+    def obter_ou_criar(self, chave, criar):
+        """Retorna o objeto em cache ou o cria com `criar()`, uma única vez por chave entre sessões simultâneas."""
+        objeto = self.obter(chave)
+        if objeto is not None:
+            logger.info(f"Modelo carregado do cache: {chave}")
+            return objeto
+
+        with self._lock_chave(chave):
+            # Outra sessão pode ter criado a entrada enquanto aguardávamos
+            objeto = self.obter(chave)
+            if objeto is None:
+                objeto = criar()
+                self.salvar(chave, objeto)
+        return objeto
+
+    def _remover_excedentes(self):
+        with self._lock:
+            entradas = []
+            for nome in os.listdir(self.diretorio):
+                if not nome.endswith(self.EXTENSAO):
+                    continue
+                caminho = os.path.join(self.diretorio, nome)
+                try:
+                    info = os.stat(caminho)
+                except FileNotFoundError:
+                    continue
+                entradas.append((info.st_mtime, info.st_size, caminho))
+
+            # Remove as entradas usadas há mais tempo até respeitar o tamanho máximo
+            tamanho_total = sum(tamanho for _, tamanho, _ in entradas)
+            for _, tamanho, caminho in sorted(entradas):
+                if tamanho_total <= self.tamanho_maximo:
+                    break
+                self._remover(caminho)
+                tamanho_total -= tamanho
+                logger.info(f"Entrada removida do cache: {caminho}")
+
+    @staticmethod
+    def _remover(caminho):
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
@@ -1,33 +1,303 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+import joblib
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
+from joblib import Parallel, delayed
+from sklearn.compose import ColumnTransformer
+from sklearn.model_selection import KFold, train_test_split
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import accuracy_score
-from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler, TargetEncoder
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_FEATURES = ["BAIRRO_CODIGO", "DIA_SEMANA", "HORARIO_FATO"]
+
+# Motores de classificação; "sgd" e "contagem" aceitam atualização incremental (partial_fit)
+MOTORES = ("logistica", "sgd", "contagem")
+MOTORES_NORMALIZADOS = ("logistica", "sgd")  # Motores que recebem as features normalizadas pelo StandardScaler
+
+# Candidatos da seleção de modelos: nome, tipo de estimador e parâmetros (dos mais baratos aos mais caros)
+CANDIDATOS = [
+    ("contagem_m1", "contagem", {"suavizacao": 1.0}),
+    ("contagem_m10", "contagem", {"suavizacao": 10.0}),
+    ("contagem_m50", "contagem", {"suavizacao": 50.0}),
+    ("logistica", "logistica", {}),
+    ("logistica_alvo", "logistica_alvo", {"C": 1.0}),
+    ("sgd_onehot", "sgd_onehot", {"alpha": 1e-4}),
+    ("logistica_onehot_c0.1", "logistica_onehot", {"C": 0.1}),
+    ("logistica_onehot_c1", "logistica_onehot", {"C": 1.0}),
+]
+
+class CachePrevisoes:
+    """Memoização LRU das previsões por (bairro, dia, hora), com contadores de acertos e falhas."""
+
+    def __init__(self, tamanho_maximo=100_000):
+        self.tamanho_maximo = tamanho_maximo
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # O lock não pode ser serializado; as entradas são descartadas para não inflar o cache de modelos
+        estado = self.__dict__.copy()
+        del estado["_lock"]
+        estado["_entradas"] = OrderedDict()
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+
+    def obter_lote(self, chaves, ocorrencias):
+        """Busca as chaves no cache; retorna tipos, probabilidades e a máscara das chaves ausentes."""
+        tipos = np.empty(len(chaves), dtype=object)
+        probabilidades = np.zeros(len(chaves), dtype=np.float64)
+        faltantes = np.ones(len(chaves), dtype=bool)
+        with self._lock:
+            for i, chave in enumerate(chaves.tolist()):
+                entrada = self._entradas.get(chave)
+                if entrada is not None:
+                    self._entradas.move_to_end(chave)
+                    tipos[i], probabilidades[i] = entrada
+                    faltantes[i] = False
+            self.acertos += int(ocorrencias[~faltantes].sum())
+            self.falhas += int(ocorrencias[faltantes].sum())
+        return tipos, probabilidades, faltantes
+
+    def guardar_lote(self, chaves, tipos, probabilidades):
+        """Armazena as previsões, descartando as menos usadas acima do tamanho máximo."""
+        if self.tamanho_maximo <= 0:
+            return
+        with self._lock:
+            for chave, tipo, probabilidade in zip(chaves.tolist(), tipos, probabilidades.tolist()):
+                self._entradas[chave] = (tipo, probabilidade)
+                self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.acertos = self.falhas = 0
+
+    def estatisticas(self):
+        """Retorna o tamanho atual e os contadores de acertos e falhas do cache."""
+        return {"entradas": len(self._entradas), "tamanho_maximo": self.tamanho_maximo,
+                "acertos": self.acertos, "falhas": self.falhas}
+
+
+class PrevisorContagem:
+    """Estima P(tipo de crime | bairro, dia, hora) por contagens suavizadas, com recuo para (bairro, hora), bairro e global."""
+
+    def __init__(self, suavizacao=10.0, alfa=1.0):
+        self.suavizacao = suavizacao  # Peso (em ocorrências) do nível superior em cada nível da hierarquia
+        self.alfa = alfa  # Pseudocontagem de cada tipo na distribuição global
+        self.classes_ = None
+        self.contagens_ = None  # Cubo bairro x dia x hora x tipo de crime
+        self.tabela_ = None  # Probabilidades suavizadas no mesmo formato do cubo
+        self.global_ = None
+
+    def fit(self, X, y):
+        self.classes_ = None
+        self.contagens_ = None
+        return self.partial_fit(X, y)
+
+    def partial_fit(self, X, y, classes=None):
+        """Soma as ocorrências ao cubo de contagens, em uma única passada vetorizada, e recalcula a tabela."""
+        codigos, dias, horas = self._colunas(X)
+        tipos, classes_lote = pd.factorize(pd.Series(y).astype(object), sort=True)
+        classes_lote = np.asarray(classes_lote, dtype=object)
+
+        # Estende o cubo com os bairros e tipos de crime ainda não vistos
+        classes = np.union1d(classes_lote, self.classes_ if self.classes_ is not None else classes_lote)
+        n_bairros = max(int(codigos.max()) + 1, 0 if self.contagens_ is None else self.contagens_.shape[0])
+        contagens = np.zeros((n_bairros, 7, 24, len(classes)), dtype=np.int64)
+        if self.contagens_ is not None:
+            anteriores = np.searchsorted(classes, self.classes_)
+            contagens[:self.contagens_.shape[0], :, :, anteriores] = self.contagens_
+
+        tipos = np.searchsorted(classes, classes_lote)[tipos]
+        posicoes = np.ravel_multi_index((codigos, dias, horas, tipos), contagens.shape)
+        contagens += np.bincount(posicoes, minlength=contagens.size).reshape(contagens.shape)
+
+        self.classes_ = classes
+        self.contagens_ = contagens
+        self._suavizar()
+        return self
+
+    def ajustar_cubo(self, cubo, classes):
+        """Ajusta o previsor diretamente a partir de um cubo de contagens já agregado (ex.: CrimeData.cubo)."""
+        self.classes_ = np.asarray(classes, dtype=object)
+        self.contagens_ = np.asarray(cubo, dtype=np.int64)
+        self._suavizar()
+        return self
+
+    def _suavizar(self):
+        """Combina cada nível com o nível superior (bairro/dia/hora -> bairro/hora -> bairro -> global)."""
+        m = self.suavizacao
+        contagens = self.contagens_.astype(np.float64)
+
+        global_ = contagens.sum(axis=(0, 1, 2)) + self.alfa
+        self.global_ = global_ / global_.sum()
+
+        por_bairro = contagens.sum(axis=(1, 2))
+        prob_bairro = (por_bairro + m * self.global_) / (por_bairro.sum(axis=-1, keepdims=True) + m)
+
+        por_bairro_hora = contagens.sum(axis=1)
+        prob_bairro_hora = (por_bairro_hora + m * prob_bairro[:, None, :]) \
+            / (por_bairro_hora.sum(axis=-1, keepdims=True) + m)
+
+        self.tabela_ = ((contagens + m * prob_bairro_hora[:, None, :, :])
+                        / (contagens.sum(axis=-1, keepdims=True) + m)).astype(np.float32)
+
+    def predict_proba(self, X):
+        """Probabilidades de cada tipo de crime por consulta à tabela; bairros desconhecidos recebem a global."""
+        codigos, dias, horas = self._colunas(X)
+        conhecidos = codigos < self.tabela_.shape[0]
+        probabilidades = np.broadcast_to(self.global_, (len(codigos), len(self.classes_))).astype(np.float64)
+        probabilidades[conhecidos] = self.tabela_[codigos[conhecidos], dias[conhecidos], horas[conhecidos]]
+        return probabilidades
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    @staticmethod
+    def _colunas(X):
+        X = np.asarray(X, dtype=np.float64)
+        return tuple(X[:, i].astype(np.int64) for i in range(len(COLUNAS_FEATURES)))
+
+
+def construir_estimador(tipo, parametros, semente=None):
+    """Cria o estimador de um candidato; todos recebem as features brutas (código do bairro, dia e hora)."""
+    if tipo == "contagem":
+        return PrevisorContagem(**parametros)
+    if tipo == "logistica":
+        return make_pipeline(StandardScaler(), LogisticRegression(**parametros))
+
+    # Bairro, dia e hora como categorias (one-hot) ou bairro pela média do alvo (target encoding)
+    if tipo == "logistica_alvo":
+        codificador = ColumnTransformer([
+            ("bairro", TargetEncoder(cv=KFold(5, shuffle=True, random_state=semente)), [0]),
+            ("tempo", OneHotEncoder(handle_unknown="ignore"), [1, 2])
+        ])
+    else:
+        codificador = OneHotEncoder(handle_unknown="ignore")
+
+    if tipo == "sgd_onehot":
+        return make_pipeline(codificador, SGDClassifier(loss="log_loss", random_state=semente, **parametros))
+    if tipo in ("logistica_onehot", "logistica_alvo"):
+        return make_pipeline(codificador, LogisticRegression(max_iter=500, **parametros))
+    raise ValueError(f"Tipo de candidato inválido: {tipo}")
+
+
+def _avaliar_dobra(tipo, parametros, semente, X, y, treino, teste):
+    """Treina o candidato em uma dobra e retorna acurácia, tempo de treino e latência de previsão (ms por mil linhas)."""
+    inicio = time.perf_counter()
+    modelo = construir_estimador(tipo, parametros, semente).fit(X[treino], y[treino])
+    tempo_treino = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    y_pred = modelo.predict(X[teste])
+    latencia = (time.perf_counter() - inicio) * 1000 / len(teste) * 1000
+    return accuracy_score(y[teste], np.asarray(y_pred, dtype=y.dtype)), tempo_treino, latencia
+
+
+def avaliar_candidatos(features, target, candidatos=CANDIDATOS, dobras=5, semente=0, orcamento=None, n_jobs=-1):
+    """Validação cruzada dos candidatos em paralelo (joblib); lotes iniciados após o orçamento (s) são ignorados."""
+    X = np.asarray(features, dtype=np.int64)
+    y, _ = pd.factorize(pd.Series(target).astype(object), sort=True)
+    divisoes = list(KFold(dobras, shuffle=True, random_state=semente).split(X))
+
+    # Lotes de candidatos com tarefas suficientes para ocupar todos os núcleos
+    nucleos = joblib.cpu_count() if n_jobs == -1 else max(1, n_jobs)
+    tamanho_lote = max(1, -(-nucleos // dobras))
+
+    relatorio = []
+    inicio = time.perf_counter()
+    with Parallel(n_jobs=n_jobs) as paralelo:
+        for posicao in range(0, len(candidatos), tamanho_lote):
+            lote = candidatos[posicao:posicao + tamanho_lote]
+            # O primeiro lote é sempre avaliado, para que haja ao menos um candidato
+            if posicao > 0 and orcamento is not None and time.perf_counter() - inicio > orcamento:
+                relatorio += [{"NOME": nome, "TIPO": tipo, "PARAMETROS": parametros, "STATUS": "fora do orçamento"}
+                              for nome, tipo, parametros in lote]
+                continue
+
+            resultados = paralelo(
+                delayed(_avaliar_dobra)(tipo, parametros, semente, X, y, treino, teste)
+                for _, tipo, parametros in lote for treino, teste in divisoes
+            )
+            for indice, (nome, tipo, parametros) in enumerate(lote):
+                acuracias, tempos, latencias = np.array(resultados[indice * dobras:(indice + 1) * dobras]).T
+                relatorio.append({
+                    "NOME": nome, "TIPO": tipo, "PARAMETROS": parametros, "STATUS": "avaliado",
+                    "ACURACIA": acuracias.mean(), "DESVIO": acuracias.std(),
+                    "TEMPO_TREINO": tempos.mean(), "LATENCIA_MS": latencias.mean()
+                })
+                logger.info(f"Candidato {nome}: acurácia {acuracias.mean():.4f} ± {acuracias.std():.4f}")
+
+    return pd.DataFrame(relatorio).set_index("NOME")
+
 
 class PrevisorCrime:
     """Classe para previsão de crimes."""
 
-    def __init__(self, crime_data):
+    def __init__(self, crime_data, usar_tensor=False, tamanho_cache=100_000, motor="logistica"):
+        if motor not in MOTORES:
+            raise ValueError(f"Motor inválido: {motor}. Opções: {MOTORES}")
+
         self.crime_data = crime_data
+        self.motor = motor
         self.modelo = None
         self.label_encoder = crime_data.label_encoder  # Armazenando o label encoder
         self.scaler = None  # Armazenando o scaler
+        self.usar_tensor = usar_tensor  # Pré-calcular as probabilidades de toda a grade após o treino
+        self.tensor_probabilidades = None  # Probabilidades no formato bairro x dia x hora x tipo de crime
+        self.classes_tensor = None
+        self.cache_previsoes = CachePrevisoes(tamanho_cache)  # Previsões já calculadas por (bairro, dia, hora)
+        self.relatorio_selecao = None  # Métricas da última seleção de modelos
+        self.candidato_escolhido = None  # Nome, tipo e parâmetros do candidato vencedor da última seleção
+
+    def treinar_modelo(self, selecionar=False, semente=None, orcamento=None, n_jobs=-1, caminho_modelo=None,
+                       candidatos=CANDIDATOS):
+        """Treina o modelo de previsão; com selecionar=True escolhe o melhor candidato por validação cruzada.
+
+        O `orcamento` (segundos) só é verificado entre os lotes de candidatos: o primeiro lote é sempre avaliado
+        e um lote iniciado dentro do orçamento roda até o fim, podendo ultrapassá-lo sem limite.
+        """
+        self.tensor_probabilidades = None
+        self.cache_previsoes.limpar()
+        self.relatorio_selecao = self.candidato_escolhido = None
 
-    def treinar_modelo(self):
-        """Treina o modelo de previsão."""
         # Separar features e target
-        features = self.crime_data.df[["BAIRRO_CODIGO", "DIA_SEMANA", "HORARIO_FATO"]]
+        features = self.crime_data.df[COLUNAS_FEATURES]
         target = self.crime_data.df["DESCR_NATUREZA_PRINCIPAL"]
 
-        # Normalizar as features e manter nomes de colunas
-        self.scaler = StandardScaler()
-        features = pd.DataFrame(self.scaler.fit_transform(features), columns=["BAIRRO_CODIGO", "DIA_SEMANA", "HORARIO_FATO"])
+        if selecionar:
+            self._selecionar_modelo(features, target, candidatos, semente, orcamento, n_jobs)
+            if caminho_modelo is not None:
+                self.salvar_modelo(caminho_modelo)
+            if self.usar_tensor:
+                self.calcular_tensor()
+            return self.relatorio_selecao
+
+        # Normalizar as features (exceto no motor de contagem) e manter nomes de colunas
+        self.scaler = StandardScaler().fit(features) if self.motor in MOTORES_NORMALIZADOS else None
+        features = self._preparar_features(features)
 
         # Dividir dados em treino e teste
-        X_train, X_test, y_train, y_test = train_test_split(features, target, test_size=0.2)
+        X_train, X_test, y_train, y_test = train_test_split(features, target, test_size=0.2, random_state=semente)
 
         # Criar e treinar o modelo
-        self.modelo = LogisticRegression()
+        self.modelo = self._criar_modelo()
         self.modelo.fit(X_train, y_train)
 
         # Avaliar o modelo
@@ -35,17 +305,244 @@ class PrevisorCrime:
         accuracy = accuracy_score(y_test, y_pred)
         print(f"Acurácia do modelo: {accuracy}")
 
+        if caminho_modelo is not None:
+            self.salvar_modelo(caminho_modelo)
+        if self.usar_tensor:
+            self.calcular_tensor()
+
+    def _selecionar_modelo(self, features, target, candidatos, semente, orcamento, n_jobs):
+        """Avalia os candidatos e treina o de maior acurácia com todos os dados."""
+        relatorio = avaliar_candidatos(features, target, candidatos, semente=semente, orcamento=orcamento, n_jobs=n_jobs)
+        avaliados = relatorio[relatorio["STATUS"] == "avaliado"]
+        if avaliados.empty:
+            raise ValueError("Nenhum candidato avaliado dentro do orçamento de tempo")
+
+        melhor = avaliados["ACURACIA"].idxmax()
+        relatorio["MELHOR"] = relatorio.index == melhor
+        logger.info(f"Melhor candidato: {melhor} (acurácia {avaliados.loc[melhor, 'ACURACIA']:.4f})")
+
+        # Os candidatos já incluem a própria normalização/codificação das features
+        self.scaler = None
+        self.modelo = construir_estimador(relatorio.loc[melhor, "TIPO"], relatorio.loc[melhor, "PARAMETROS"], semente)
+        self.modelo.fit(self._preparar_features(features), target)
+        self.relatorio_selecao = relatorio
+        self.candidato_escolhido = {
+            "candidato": melhor, "tipo": relatorio.loc[melhor, "TIPO"], "parametros": relatorio.loc[melhor, "PARAMETROS"]
+        }
+        return relatorio
+
+    def salvar_modelo(self, caminho):
+        """Salva o modelo treinado (.joblib) e as métricas da seleção (.json) em disco."""
+        if self.modelo is None:
+            raise ValueError("O modelo ainda não foi treinado")
+
+        base = self._base_arquivo(caminho, ".joblib")
+        joblib.dump({
+            "modelo": self.modelo,
+            "scaler": self.scaler,
+            "bairros": [str(bairro) for bairro in self.label_encoder.classes_]
+        }, base + ".joblib")
+
+        # Após uma seleção, o motor registrado é o tipo do candidato vencedor, não o motor padrão do previsor
+        relatorio = [] if self.relatorio_selecao is None else self.relatorio_selecao.reset_index().to_dict("records")
+        escolhido = self.candidato_escolhido
+        with open(base + ".json", "w", encoding="utf-8") as arquivo:
+            json.dump({
+                "motor": self.motor if escolhido is None else escolhido["tipo"],
+                "candidato": escolhido, "selecao": relatorio
+            }, arquivo, ensure_ascii=False, default=str)
+        return base + ".joblib"
+
+    def carregar_modelo(self, caminho):
+        """Carrega um modelo salvo com salvar_modelo, dispensando o treino."""
+        base = self._base_arquivo(caminho, ".joblib")
+        salvo = joblib.load(base + ".joblib")
+
+        # Os códigos dos bairros são estáveis: o modelo vale enquanto seus bairros forem um prefixo dos atuais
+        bairros = [str(bairro) for bairro in self.label_encoder.classes_]
+        if salvo["bairros"] != bairros[:len(salvo["bairros"])]:
+            raise ValueError("O modelo salvo não corresponde aos bairros dos dados carregados")
+
+        self.modelo, self.scaler = salvo["modelo"], salvo["scaler"]
+        self.tensor_probabilidades = None
+        self.cache_previsoes.limpar()
+        if self.usar_tensor:
+            self.calcular_tensor()
+        return self.modelo
+
+    def _criar_modelo(self, motor=None):
+        motor = motor or self.motor
+        if motor == "sgd":
+            return SGDClassifier(loss="log_loss")
+        if motor == "contagem":
+            return PrevisorContagem()
+        return LogisticRegression()
+
+    def _preparar_features(self, features):
+        """Normaliza as features para os motores que dependem de escala; o motor de contagem usa os códigos brutos."""
+        if self.scaler is None:
+            return pd.DataFrame(np.asarray(features), columns=COLUNAS_FEATURES)
+        return pd.DataFrame(self.scaler.transform(features), columns=COLUNAS_FEATURES)
+
+    def comparar_motores(self, motores=MOTORES, semente=0, test_size=0.2):
+        """Treina cada motor na mesma divisão treino/teste (com semente) e compara acurácia e tempos."""
+        features = self.crime_data.df[COLUNAS_FEATURES]
+        target = self.crime_data.df["DESCR_NATUREZA_PRINCIPAL"]
+        X_train, X_test, y_train, y_test = train_test_split(features, target, test_size=test_size, random_state=semente)
+
+        resultados = []
+        for motor in motores:
+            inicio = time.perf_counter()
+            scaler = StandardScaler().fit(X_train) if motor in MOTORES_NORMALIZADOS else None
+            treino = scaler.transform(X_train) if scaler is not None else X_train.to_numpy()
+            modelo = self._criar_modelo(motor)
+            modelo.fit(pd.DataFrame(treino, columns=COLUNAS_FEATURES), y_train)
+            tempo_treino = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            teste = scaler.transform(X_test) if scaler is not None else X_test.to_numpy()
+            y_pred = modelo.predict(pd.DataFrame(teste, columns=COLUNAS_FEATURES))
+            tempo_previsao = time.perf_counter() - inicio
+
+            resultados.append({
+                "MOTOR": motor,
+                "ACURACIA": accuracy_score(np.asarray(y_test, dtype=object), np.asarray(y_pred, dtype=object)),
+                "TEMPO_TREINO": tempo_treino,
+                "TEMPO_PREVISAO": tempo_previsao
+            })
+            logger.info(f"Motor {motor}: acurácia {resultados[-1]['ACURACIA']:.4f}, treino {tempo_treino:.3f}s")
+        return pd.DataFrame(resultados).set_index("MOTOR")
+
+    def atualizar_modelo(self, novos):
+        """Atualiza o modelo com as ocorrências anexadas (CrimeData.anexar), sem retreinar do zero quando possível."""
+        if self.modelo is None:
+            self.treinar_modelo()
+            return
+
+        # O label encoder é o mesmo objeto dos dados, já estendido com os bairros novos
+        self.label_encoder = self.crime_data.label_encoder
+        self.tensor_probabilidades = None
+        self.cache_previsoes.limpar()
+
+        # O motor de contagem incorpora tipos novos no próprio ajuste parcial
+        tipos_novos = set(novos["DESCR_NATUREZA_PRINCIPAL"].unique()) - set(self.modelo.classes_)
+        if tipos_novos and not isinstance(self.modelo, PrevisorContagem):
+            logger.info(f"Novos tipos de crime nas ocorrências anexadas ({sorted(tipos_novos)}); retreinando o modelo")
+            self.treinar_modelo()
+            return
+
+        # A normalização do treino é mantida, para que os coeficientes já aprendidos continuem válidos
+        if hasattr(self.modelo, "partial_fit"):
+            # Ajuste parcial apenas com o delta: custo proporcional às novas ocorrências
+            features = self._preparar_features(novos[COLUNAS_FEATURES])
+            self.modelo.partial_fit(features, novos["DESCR_NATUREZA_PRINCIPAL"])
+        else:
+            # Sem ajuste parcial: reajuste sobre todo o histórico partindo dos coeficientes atuais (warm start)
+            df = self.crime_data.df
+            features = self._preparar_features(df[COLUNAS_FEATURES])
+            if "warm_start" in self.modelo.get_params():
+                self.modelo.set_params(warm_start=True)
+            self.modelo.fit(features, df["DESCR_NATUREZA_PRINCIPAL"])
+        logger.info(f"Modelo ({self.motor}) atualizado com {len(novos)} novas ocorrências")
+
+        if self.usar_tensor:
+            self.calcular_tensor()
+
+    def calcular_tensor(self):
+        """Avalia o modelo uma única vez sobre toda a grade bairro x dia x hora e armazena as probabilidades."""
+        n_bairros = len(self.label_encoder.classes_)
+        codigos, dias, horas = np.meshgrid(np.arange(n_bairros), np.arange(7), np.arange(24), indexing="ij")
+
+        previsao = self._prever_probabilidades(codigos.ravel(), dias.ravel(), horas.ravel())
+        self.tensor_probabilidades = previsao.astype(np.float32).reshape(n_bairros, 7, 24, -1)
+        self.classes_tensor = self.modelo.classes_
+        return self.tensor_probabilidades
+
+    def salvar_tensor(self, caminho):
+        """Salva o tensor de probabilidades (.npy) e seus metadados (.json) em disco."""
+        if self.tensor_probabilidades is None:
+            raise ValueError("O tensor de probabilidades ainda não foi calculado")
+
+        base = self._base_arquivo(caminho, ".npy")
+        np.save(base + ".npy", np.ascontiguousarray(self.tensor_probabilidades))
+        metadados = {
+            "bairros": [str(bairro) for bairro in self.label_encoder.classes_],
+            "classes": [str(classe) for classe in self.classes_tensor]
+        }
+        with open(base + ".json", "w", encoding="utf-8") as arquivo:
+            json.dump(metadados, arquivo, ensure_ascii=False)
+        return base + ".npy"
+
+    def carregar_tensor(self, caminho, mmap=True):
+        """Carrega um tensor salvo com salvar_tensor, mapeado em memória por padrão, dispensando o treino."""
+        base = self._base_arquivo(caminho, ".npy")
+        with open(base + ".json", encoding="utf-8") as arquivo:
+            metadados = json.load(arquivo)
+
+        if metadados["bairros"] != [str(bairro) for bairro in self.label_encoder.classes_]:
+            raise ValueError("O tensor salvo não corresponde aos bairros dos dados carregados")
+
+        self.tensor_probabilidades = np.load(base + ".npy", mmap_mode="r" if mmap else None)
+        self.classes_tensor = np.array(metadados["classes"], dtype=object)
+        return self.tensor_probabilidades
+
+    @staticmethod
+    def _base_arquivo(caminho, extensao):
+        caminho = os.fspath(caminho)
+        return caminho[:-len(extensao)] if caminho.endswith(extensao) else caminho
+
     def prever_local_horario(self, bairro, dia_semana, hora):
         """Prever o tipo de crime com maior probabilidade para um local e horário específico."""
-        # Convertendo o bairro para o código do label encoding
-        bairro_codigo = self.label_encoder.transform([bairro])[0]
+        tipos_crime, probabilidades = self.prever_lote([bairro], [dia_semana], [hora])
+        return tipos_crime[0], probabilidades[0]
+
+    def prever_lote(self, bairros, dias_semana, horas):
+        """Prever, em uma única passada vetorizada, o tipo de crime mais provável para vários locais e horários."""
+        bairros, dias_semana, horas = np.broadcast_arrays(np.asarray(bairros), np.asarray(dias_semana), np.asarray(horas))
+
+        # Convertendo os bairros para os códigos do label encoding
+        bairros_codigos = self.label_encoder.transform(bairros.ravel())
+
+        if self.tensor_probabilidades is not None:
+            # Com o tensor pré-calculado a previsão é apenas uma indexação
+            previsao = self.tensor_probabilidades[
+                bairros_codigos, dias_semana.ravel().astype(np.intp), horas.ravel().astype(np.intp)
+            ]
+            classes = self.classes_tensor
+        else:
+            return self._prever_com_cache(bairros_codigos, dias_semana.ravel(), horas.ravel())
+
+        # Tipo de crime com maior probabilidade para cada linha
+        indices = previsao.argmax(axis=1)
+        tipos_crime = classes[indices]
+        probabilidades = previsao[np.arange(len(indices)), indices]
+        return tipos_crime, probabilidades
+
+    def _prever_com_cache(self, bairros_codigos, dias_semana, horas):
+        """Consulta o cache por (bairro, dia, hora) e chama o modelo uma única vez para as combinações ausentes."""
+        chaves = (np.asarray(bairros_codigos, dtype=np.int64) * 7 + np.asarray(dias_semana, dtype=np.int64)) * 24 \
+            + np.asarray(horas, dtype=np.int64)
+        chaves_unicas, inversas = np.unique(chaves, return_inverse=True)
+        tipos, probabilidades, faltantes = self.cache_previsoes.obter_lote(
+            chaves_unicas, np.bincount(inversas.ravel(), minlength=len(chaves_unicas))
+        )
+
+        if faltantes.any():
+            codigos, resto = np.divmod(chaves_unicas[faltantes], 7 * 24)
+            dias, horas_faltantes = np.divmod(resto, 24)
+            previsao = self._prever_probabilidades(codigos, dias, horas_faltantes)
+            indices = previsao.argmax(axis=1)
+            tipos[faltantes] = self.modelo.classes_[indices]
+            probabilidades[faltantes] = previsao[np.arange(len(indices)), indices]
+            self.cache_previsoes.guardar_lote(chaves_unicas[faltantes], tipos[faltantes], probabilidades[faltantes])
+
+        return tipos[inversas.ravel()], probabilidades[inversas.ravel()]
 
+    def _prever_probabilidades(self, bairros_codigos, dias_semana, horas):
         # Organizar os dados de entrada em um DataFrame com as mesmas colunas e normalizá-los
-        entrada = pd.DataFrame([[bairro_codigo, dia_semana, hora]], columns=["BAIRRO_CODIGO", "DIA_SEMANA", "HORARIO_FATO"])
-        entrada = self.scaler.transform(entrada)  # Normaliza a entrada
-
-        # Prever o tipo de crime com maior probabilidade usando o modelo
-        previsao = self.modelo.predict_proba(pd.DataFrame(entrada, columns=["BAIRRO_CODIGO", "DIA_SEMANA", "HORARIO_FATO"]))
-        tipo_crime = self.modelo.classes_[previsao.argmax()]
-        probabilidade = previsao[0][previsao.argmax()]
-        return tipo_crime, probabilidade
+        entrada = pd.DataFrame({
+            "BAIRRO_CODIGO": bairros_codigos,
+            "DIA_SEMANA": dias_semana,
+            "HORARIO_FATO": horas
+        })
+        return self.modelo.predict_proba(self._preparar_features(entrada))  # Normaliza a entrada
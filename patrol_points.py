@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+from shift_schedule import Escala
+
+# Colunas dos pontos, na ordem usada na exportação (horários em minutos desde a meia-noite)
+COLUNAS_PONTOS = [
+    "DIA_SEMANA", "HORARIO_INICIO", "HORARIO_TERMINO", "BAIRRO", "LOGRADOURO",
+    "LATITUDE", "LONGITUDE", "OBJETIVO", "MISSAO", "OBSERVACAO"
+]
+TIPOS_PONTOS = {
+    "DIA_SEMANA": "int8", "HORARIO_INICIO": "int16", "HORARIO_TERMINO": "int16", "BAIRRO": "category",
+    "LOGRADOURO": "category", "LATITUDE": "float64", "LONGITUDE": "float64",
+    "OBJETIVO": "object", "MISSAO": "object", "OBSERVACAO": "object", "DIA": "int16"
+}
+
+# Texto HH:MM de cada minuto do dia, para formatar os horários sem laço
+_HORARIOS_TEXTO = np.array([f"{minuto // 60:02d}:{minuto % 60:02d}" for minuto in range(24 * 60)], dtype=object)
+
+
+def formatar_horarios(minutos):
+    """Converte minutos desde a meia-noite em texto HH:MM."""
+    return _HORARIOS_TEXTO[np.asarray(minutos, dtype=np.int64) % (24 * 60)]
+
+
+class PontosPatrulhamento:
+    """Pontos de patrulhamento em formato colunar, com índice por (viatura, dia, faixa horária).
+
+    DIA é o dia do cartão (0 a escala.dias - 1) e as faixas horárias são os turnos da escala.
+    """
+
+    def __init__(self, df=None, escala=None):
+        self.escala = escala if escala is not None else Escala()
+        if df is None:
+            df = pd.DataFrame({coluna: pd.Series(dtype=tipo) for coluna, tipo in TIPOS_PONTOS.items()})
+        elif "DIA" not in df.columns:
+            df = df.assign(DIA=df["DIA_SEMANA"])
+
+        # Cartões de várias viaturas trazem a coluna VIATURA; os pontos ficam agrupados por viatura
+        self.possui_viaturas = "VIATURA" in df.columns
+        tipos = {**TIPOS_PONTOS, "VIATURA": "category"} if self.possui_viaturas else TIPOS_PONTOS
+        ordem = ["DIA", "HORARIO_INICIO"]
+        if self.possui_viaturas:
+            ordem = ["VIATURA"] + ordem
+        self.df = df.astype(tipos).sort_values(ordem, kind="stable").reset_index(drop=True)
+        self.df["FAIXA_HORARIA"] = self.escala.classificar_turnos(self.df["HORARIO_INICIO"])
+
+        # Posições das linhas de cada (viatura, dia, faixa horária) e de cada (dia, faixa horária), calculadas uma única vez
+        self._indice_dia = self.df.groupby(["DIA", "FAIXA_HORARIA"]).indices
+        if self.possui_viaturas:
+            self._indice = self.df.groupby(["VIATURA", "DIA", "FAIXA_HORARIA"], observed=True).indices
+        else:
+            self._indice = {(None,) + chave: posicoes for chave, posicoes in self._indice_dia.items()}
+
+    @classmethod
+    def de_colunas(cls, blocos, escala=None):
+        """Junta os blocos de colunas (dicionários de listas) gerados pelas tarefas."""
+        colunas = COLUNAS_PONTOS + ["DIA"] + (["VIATURA"] if blocos and "VIATURA" in blocos[0] else [])
+        dados = {coluna: [valor for bloco in blocos for valor in bloco[coluna]] for coluna in colunas}
+        return cls(pd.DataFrame(dados), escala)
+
+    def __len__(self):
+        return len(self.df)
+
+    def grupos(self):
+        """Posições das linhas de cada (viatura, dia, faixa horária); a viatura é None em cartões únicos."""
+        return self._indice.items()
+
+    def viaturas(self):
+        """Viaturas que possuem pontos, em ordem."""
+        return sorted({viatura for viatura, _, _ in self._indice if viatura is not None})
+
+    def dias(self, viatura=None):
+        """Dias do cartão que possuem pontos (da viatura, se informada), em ordem."""
+        return sorted({dia for chave_viatura, dia, _ in self._indice if viatura is None or chave_viatura == viatura})
+
+    def filtrar(self, dia, faixa_horaria=None, viatura=None):
+        """Pontos de um dia do cartão e, opcionalmente, de uma faixa horária e viatura, consultando o índice pré-calculado."""
+        if viatura is None and faixa_horaria is not None:
+            posicoes = self._indice_dia.get((dia, faixa_horaria), np.array([], dtype=np.int64))
+        else:
+            posicoes = [
+                self._indice[chave] for chave in self._indice
+                if chave[1] == dia and (faixa_horaria is None or chave[2] == faixa_horaria)
+                and (viatura is None or chave[0] == viatura)
+            ]
+            posicoes = np.sort(np.concatenate(posicoes)) if posicoes else np.array([], dtype=np.int64)
+        return self.df.iloc[posicoes]
+
+    def tabela_exportacao(self, dia, viatura=None):
+        """Pontos de um dia prontos para exportação, com os horários em HH:MM e a ordem de ocupação (por viatura)."""
+        colunas = (["VIATURA"] if self.possui_viaturas else []) + COLUNAS_PONTOS
+        pontos = self.filtrar(dia, viatura=viatura)[colunas].copy()
+        for coluna in ["HORARIO_INICIO", "HORARIO_TERMINO"]:
+            pontos[coluna] = formatar_horarios(pontos[coluna])
+        if self.possui_viaturas:
+            ordem = pontos.groupby("VIATURA", observed=True).cumcount().to_numpy() + 1
+        else:
+            ordem = np.arange(1, len(pontos) + 1)
+        pontos.insert(0, "ORDEM_OCUPACAO", ordem)
+        return pontos
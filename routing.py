@@ -0,0 +1,136 @@
+import numpy as np
+from patrol_points import COLUNAS_PONTOS, PontosPatrulhamento
+
+RAIO_TERRA_KM = 6371.0
+
+
+def matriz_haversine(latitudes, longitudes):
+    """Distâncias (km) entre todos os pares de coordenadas, calculadas de uma só vez."""
+    latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))
+    longitudes = np.radians(np.asarray(longitudes, dtype=np.float64))
+    delta_lat = latitudes[:, None] - latitudes[None, :]
+    delta_lon = longitudes[:, None] - longitudes[None, :]
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(latitudes)[:, None] * np.cos(latitudes)[None, :] * np.sin(delta_lon / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def comprimento_rota(rota, distancias):
+    """Distância total percorrida seguindo a rota (sem retorno ao início)."""
+    return float(distancias[rota[:-1], rota[1:]].sum())
+
+
+def janelas_posicoes(horas_paradas, horas_posicoes, tolerancia):
+    """Primeira e última posição da rota que cada parada pode ocupar, dada a hora de cada posição."""
+    primeiras = np.searchsorted(horas_posicoes, horas_paradas - tolerancia, side="left")
+    ultimas = np.searchsorted(horas_posicoes, horas_paradas + tolerancia, side="right") - 1
+    return primeiras, ultimas
+
+
+def rota_viavel(rota, primeiras, ultimas):
+    posicoes = np.arange(len(rota))
+    return bool(((primeiras[rota] <= posicoes) & (posicoes <= ultimas[rota])).all())
+
+
+def vizinho_mais_proximo(distancias, primeiras, ultimas):
+    """Rota gulosa: a cada posição vai à parada liberada mais próxima, restrita às que não podem mais esperar."""
+    n = len(distancias)
+    rota = np.empty(n, dtype=np.int64)
+    livres = np.ones(n, dtype=bool)
+    atual = None
+    for posicao in range(n):
+        elegiveis = livres & (primeiras <= posicao)
+
+        # Se as paradas que vencem até a posição q já ocupam todas as posições até q, uma delas vai agora
+        vencimentos = np.cumsum(np.bincount(np.clip(ultimas[livres], posicao, n - 1), minlength=n))[posicao:]
+        apertadas = np.flatnonzero(vencimentos >= np.arange(1, n - posicao + 1))
+        if len(apertadas):
+            urgentes = elegiveis & (ultimas <= posicao + apertadas[0])
+            if urgentes.any():
+                elegiveis = urgentes
+        if not elegiveis.any():
+            elegiveis = livres
+
+        candidatas = np.flatnonzero(elegiveis)
+        atual = candidatas[0] if atual is None else candidatas[np.argmin(distancias[atual, candidatas])]
+        rota[posicao] = atual
+        livres[atual] = False
+    return rota
+
+
+def melhorar_2opt(rota, distancias, primeiras, ultimas, maximo_passadas=50):
+    """Inverte trechos da rota enquanto houver ganho, aceitando apenas inversões que respeitam as janelas.
+
+    Para cada início de trecho, o ganho e a viabilidade de todos os fins possíveis são avaliados de uma vez.
+    """
+    rota = np.array(rota, dtype=np.int64)
+    n = len(rota)
+    if n < 3:
+        return rota
+
+    for _ in range(maximo_passadas):
+        melhorou = False
+        for i in range(n - 1):
+            fins = np.arange(i + 1, n)
+            ultimo = fins == n - 1
+            trechos = rota[fins]
+            seguintes = rota[np.minimum(fins + 1, n - 1)]
+
+            custo_atual = np.where(ultimo, 0.0, distancias[trechos, seguintes])
+            custo_novo = np.where(ultimo, 0.0, distancias[rota[i], seguintes])
+            if i > 0:
+                custo_atual = custo_atual + distancias[rota[i - 1], rota[i]]
+                custo_novo = custo_novo + distancias[rota[i - 1], trechos]
+
+            # A parada na posição q vai para i + fim - q; a inversão é viável se todas ficam em suas janelas
+            posicoes = np.arange(i, n)
+            limite_inferior = np.maximum.accumulate(posicoes + primeiras[rota[i:]])[1:]
+            limite_superior = np.minimum.accumulate(posicoes + ultimas[rota[i:]])[1:]
+            somas = i + fins
+            viaveis = (limite_inferior <= somas) & (somas <= limite_superior)
+
+            ganhos = np.where(viaveis, custo_atual - custo_novo, 0.0)
+            melhor = int(np.argmax(ganhos))
+            if ganhos[melhor] > 1e-9:
+                fim = fins[melhor]
+                rota[i:fim + 1] = rota[i:fim + 1][::-1]
+                melhorou = True
+        if not melhorou:
+            break
+    return rota
+
+
+def otimizar_rotas(pontos, tolerancia=0):
+    """Reordena as paradas de cada turno (de cada viatura) pela menor distância, mantendo cada parada
+    a até `tolerancia` horas da hora prevista. Os horários do turno são redistribuídos na nova ordem.
+
+    Retorna os pontos reordenados e as distâncias totais (km) antes e depois.
+    """
+    df = pontos.df
+    latitudes = df["LATITUDE"].to_numpy(dtype=np.float64)
+    longitudes = df["LONGITUDE"].to_numpy(dtype=np.float64)
+    inicios = df["HORARIO_INICIO"].to_numpy(dtype=np.int64)
+    duracoes = df["HORARIO_TERMINO"].to_numpy(dtype=np.int64) - inicios
+    novos_inicios = inicios.copy()
+
+    distancia_antes = distancia_depois = 0.0
+    for _, posicoes in pontos.grupos():
+        posicoes = posicoes[np.argsort(inicios[posicoes], kind="stable")]
+        distancias = matriz_haversine(latitudes[posicoes], longitudes[posicoes])
+        original = np.arange(len(posicoes))
+        distancia_antes += comprimento_rota(original, distancias)
+
+        horarios = inicios[posicoes]
+        primeiras, ultimas = janelas_posicoes(horarios // 60, horarios // 60, tolerancia)
+        rota = vizinho_mais_proximo(distancias, primeiras, ultimas)
+        if not rota_viavel(rota, primeiras, ultimas):
+            rota = original
+        rota = melhorar_2opt(rota, distancias, primeiras, ultimas)
+        distancia_depois += comprimento_rota(rota, distancias)
+
+        # A parada na posição p da rota assume o p-ésimo horário do turno
+        novos_inicios[posicoes[rota]] = horarios
+
+    reordenados = df[COLUNAS_PONTOS + ["DIA"] + (["VIATURA"] if pontos.possui_viaturas else [])].copy()
+    reordenados["HORARIO_INICIO"] = novos_inicios
+    reordenados["HORARIO_TERMINO"] = novos_inicios + duracoes
+    return PontosPatrulhamento(reordenados, pontos.escala), (distancia_antes, distancia_depois)
@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+import numpy as np
+
+# Máximo de conjuntos de dados mantidos anexados em cada processo de trabalho
+MAXIMO_ANEXOS = 4
+
+_anexos = OrderedDict()
+
+
+class DadosCompartilhados:
+    """Publica arrays NumPy em arquivos mapeados em memória, para que os processos de trabalho os leiam sem cópia."""
+
+    def __init__(self, arrays):
+        self.diretorio = tempfile.mkdtemp(prefix="autocard_")
+        for nome, valores in arrays.items():
+            np.save(os.path.join(self.diretorio, nome + ".npy"), np.ascontiguousarray(valores))
+
+        # Descritor leve enviado aos processos no lugar dos dados
+        self.descritor = (self.diretorio, tuple(arrays))
+        self._finalizador = weakref.finalize(self, shutil.rmtree, self.diretorio, True)
+
+    def liberar(self):
+        """Remove os arquivos publicados."""
+        self._finalizador()
+
+    @staticmethod
+    def anexar(descritor):
+        """Abre (uma única vez por processo) os arrays publicados, mapeados em memória somente para leitura."""
+        diretorio, nomes = descritor
+        if diretorio in _anexos:
+            _anexos.move_to_end(diretorio)
+            return _anexos[diretorio]
+
+        arrays = {nome: np.load(os.path.join(diretorio, nome + ".npy"), mmap_mode="r") for nome in nomes}
+        _anexos[diretorio] = arrays
+        while len(_anexos) > MAXIMO_ANEXOS:
+            _anexos.popitem(last=False)
+        return arrays
@@ -0,0 +1,125 @@
+import json
+import numpy as np
+from utils import dias_da_semana
+
+# Turnos padrão do dia: nome, hora inicial e hora final (exclusiva)
+TURNOS = [("Madrugada", 0, 6), ("Manhã", 6, 12), ("Tarde", 12, 18), ("Noite", 18, 24)]
+
+
+def turnos_por_hora(turnos):
+    """Índice do turno de cada hora do dia (-1 nas horas fora de qualquer turno)."""
+    indices = np.full(24, -1, dtype=np.int64)
+    for indice, (_, inicio, fim) in enumerate(turnos):
+        indices[inicio:fim] = indice
+    return indices
+
+
+class Escala:
+    """Escala dos cartões: turnos, duração dos horários (slots), paradas por horário, duração de cada parada e dias.
+
+    É a única definição lida pela geração, filtragem, gráficos e exportação.
+    """
+
+    def __init__(self, turnos=TURNOS, duracao_slot=60, paradas_por_slot=1, duracao_parada=20, dias=7,
+                 dia_semana_inicial=0):
+        self.turnos = [(str(nome), int(inicio), int(fim)) for nome, inicio, fim in turnos]
+        self.duracao_slot = int(duracao_slot)  # Minutos
+        self.paradas_por_slot = int(paradas_por_slot)
+        self.duracao_parada = int(duracao_parada)  # Minutos
+        self.dias = int(dias)
+        self.dia_semana_inicial = int(dia_semana_inicial)
+        self._validar()
+
+        # Grade de um dia: início (minutos), turno e posição dentro do turno de cada slot coberto por um turno
+        inicios = np.arange(0, 24 * 60, self.duracao_slot)
+        turnos_slots = turnos_por_hora(self.turnos)[inicios // 60]
+        cobertos = turnos_slots >= 0
+        self.inicio_slots = inicios[cobertos]
+        self.turno_slots = turnos_slots[cobertos]
+        inicio_turnos = np.array([inicio for _, inicio, _ in self.turnos]) * 60
+        self.posicao_slots = (self.inicio_slots - inicio_turnos[self.turno_slots]) // self.duracao_slot
+
+    def _validar(self):
+        # A duração do horário vem primeiro: as demais verificações dividem por ela
+        if self.duracao_slot <= 0 or (24 * 60) % self.duracao_slot:
+            raise ValueError(f"Duração de horário inválida: {self.duracao_slot} minutos (deve dividir o dia)")
+        if not self.turnos:
+            raise ValueError("A escala precisa de ao menos um turno")
+        fim_anterior = 0
+        for nome, inicio, fim in self.turnos:
+            if not fim_anterior <= inicio < fim <= 24:
+                raise ValueError(f"Turno inválido ou sobreposto: {nome} ({inicio}h-{fim}h)")
+            if (inicio * 60) % self.duracao_slot or (fim * 60) % self.duracao_slot:
+                raise ValueError(f"Os limites do turno {nome} não coincidem com horários de {self.duracao_slot} minutos")
+            fim_anterior = fim
+
+        if self.paradas_por_slot < 1 or self.duracao_parada < 1 \
+                or self.paradas_por_slot * self.duracao_parada > self.duracao_slot:
+            raise ValueError(
+                f"{self.paradas_por_slot} paradas de {self.duracao_parada} minutos não cabem em {self.duracao_slot} minutos"
+            )
+        if self.dias < 1 or not 0 <= self.dia_semana_inicial < 7:
+            raise ValueError(f"Dias inválidos: {self.dias} dias a partir do dia da semana {self.dia_semana_inicial}")
+
+    @classmethod
+    def de_dicionario(cls, dados):
+        return cls(**dados)
+
+    @classmethod
+    def de_json(cls, caminho):
+        """Carrega a escala de um arquivo JSON com os mesmos campos do construtor."""
+        with open(caminho, encoding="utf-8") as arquivo:
+            return cls.de_dicionario(json.load(arquivo))
+
+    def para_dicionario(self):
+        return {
+            "turnos": [list(turno) for turno in self.turnos], "duracao_slot": self.duracao_slot,
+            "paradas_por_slot": self.paradas_por_slot, "duracao_parada": self.duracao_parada,
+            "dias": self.dias, "dia_semana_inicial": self.dia_semana_inicial
+        }
+
+    def _chave(self):
+        return (tuple(self.turnos), self.duracao_slot, self.paradas_por_slot, self.duracao_parada, self.dias,
+                self.dia_semana_inicial)
+
+    def __eq__(self, outra):
+        return isinstance(outra, Escala) and self._chave() == outra._chave()
+
+    def __hash__(self):
+        return hash(self._chave())
+
+    def __repr__(self):
+        return f"Escala({self.para_dicionario()})"
+
+    @property
+    def slots_por_dia(self):
+        return len(self.inicio_slots)
+
+    def dias_semana(self):
+        """Dia da semana de cada dia do cartão."""
+        return (self.dia_semana_inicial + np.arange(self.dias)) % 7
+
+    def titulo_dia(self, dia):
+        """Nome do dia do cartão: o dia da semana, precedido do número do dia quando o cartão passa de uma semana."""
+        nome = dias_da_semana[int(self.dias_semana()[dia])]
+        return nome if self.dias <= 7 else f"Dia {dia + 1:02d} - {nome}"
+
+    def rotulos_turnos(self):
+        return [f"{nome} ({inicio:02d}:00-{fim - 1:02d}:59)" for nome, inicio, fim in self.turnos]
+
+    def classificar_turnos(self, minutos):
+        """Turno (índice em turnos) de cada horário, em minutos desde a meia-noite; -1 fora dos turnos."""
+        return turnos_por_hora(self.turnos)[(np.asarray(minutos, dtype=np.int64) // 60) % 24].astype(np.int8)
+
+    def grade(self):
+        """Grade vetorizada de todas as paradas do cartão (dia x slot x parada), como arrays planos."""
+        formato = (self.dias, self.slots_por_dia, self.paradas_por_slot)
+        dias, slots, paradas = (indice.ravel() for indice in np.indices(formato))
+        inicios = self.inicio_slots[slots] + paradas * (self.duracao_slot // self.paradas_por_slot)
+        return {
+            "DIA": dias,
+            "DIA_SEMANA": self.dias_semana()[dias],
+            "HORA": self.inicio_slots[slots] // 60,
+            "INICIO": inicios,
+            "TERMINO": inicios + self.duracao_parada
+        }